@@ -1,9 +1,10 @@
 from django.contrib import admin
 
 # Giving admin module access to kwis models
-from .models import Quiz, Team, Round, Answer
+from .models import Quiz, Team, Round, Answer, ScoreBatch
 
 admin.site.register(Quiz)
 admin.site.register(Team)
 admin.site.register(Round)
 admin.site.register(Answer)
+admin.site.register(ScoreBatch)
@@ -0,0 +1,109 @@
+"""
+Maintenance of the aggregates stored on teams and rounds: the subtotal and maximum total of each team
+and the number of answers of each round.
+
+Single answers adjust the aggregates with F-expressions, so concurrent changes add up correctly.
+Changes made in bulk recompute the aggregates of the teams and rounds involved from the answers.
+"""
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, DecimalField, F, IntegerField, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+from .models import Answer, Round, Team
+
+
+def _decimal(value):
+    return Decimal(str(value))
+
+
+def _add_answer(team_id, rnd_id, score):
+    max_score = Subquery(Round.objects.filter(pk=rnd_id).values('max_score')[:1])
+    Team.objects.filter(pk=team_id).update(subtotal=F('subtotal') + _decimal(score), max_total=F('max_total') + max_score)
+    Round.objects.filter(pk=rnd_id).update(answered_count=F('answered_count') + 1)
+
+
+def _remove_answer(team_id, rnd_id, score):
+    max_score = Subquery(Round.objects.filter(pk=rnd_id).values('max_score')[:1])
+    Team.objects.filter(pk=team_id).update(subtotal=F('subtotal') - _decimal(score), max_total=F('max_total') - max_score)
+    Round.objects.filter(pk=rnd_id).update(answered_count=F('answered_count') - 1)
+
+
+def answer_loaded(answer):
+    """
+    Remember what an answer looks like in the database, before it is changed and saved.
+    """
+    answer._stored = Answer.objects.filter(pk=answer.pk).values_list('team_id', 'rnd_id', 'score').first() if answer.pk else None
+
+
+def answer_saved(answer):
+    with transaction.atomic():
+        stored = getattr(answer, '_stored', None)
+        if stored is not None and stored[:2] == (answer.team_id, answer.rnd_id):
+            Team.objects.filter(pk=answer.team_id).update(subtotal=F('subtotal') + (_decimal(answer.score) - stored[2]))
+        else:
+            if stored is not None:
+                _remove_answer(*stored)
+            _add_answer(answer.team_id, answer.rnd_id, answer.score)
+    answer._stored = (answer.team_id, answer.rnd_id, _decimal(answer.score))
+
+
+def answer_deleted(answer):
+    with transaction.atomic():
+        _remove_answer(answer.team_id, answer.rnd_id, answer.score)
+
+
+def round_loaded(rnd):
+    rnd._stored_max_score = Round.objects.filter(pk=rnd.pk).values_list('max_score', flat=True).first() if rnd.pk else None
+
+
+def round_saved(rnd):
+    # The maximum totals of the teams that answered the round follow its maximum score
+    stored = getattr(rnd, '_stored_max_score', None)
+    if stored is not None and stored != _decimal(rnd.max_score):
+        Team.objects.filter(answer__rnd=rnd).update(max_total=F('max_total') + (_decimal(rnd.max_score) - stored))
+    rnd._stored_max_score = _decimal(rnd.max_score)
+
+
+def _team_sum(field):
+    answers = Answer.objects.filter(team=OuterRef('pk')).order_by().values('team')
+    output_field = DecimalField(max_digits=8, decimal_places=1)
+    total = Subquery(answers.annotate(total=Sum(field)).values('total'), output_field=output_field)
+    return Coalesce(total, Value(Decimal(0)), output_field=output_field)
+
+
+def _round_count():
+    answers = Answer.objects.filter(rnd=OuterRef('pk')).order_by().values('rnd')
+    count = Subquery(answers.annotate(count=Count('pk')).values('count'), output_field=IntegerField())
+    return Coalesce(count, Value(0))
+
+
+def rebuild(team_ids=None, round_ids=None):
+    """
+    Recompute the aggregates from the answers, for the given teams and rounds or for all of them.
+    """
+    teams, rounds = Team.objects.all(), Round.objects.all()
+    if team_ids is not None:
+        teams = teams.filter(pk__in=team_ids)
+    if round_ids is not None:
+        rounds = rounds.filter(pk__in=round_ids)
+    with transaction.atomic():
+        teams.update(subtotal=_team_sum('score'), max_total=_team_sum('rnd__max_score'))
+        rounds.update(answered_count=_round_count())
+
+
+def verify():
+    """
+    Return descriptions of the stored aggregates that differ from the answers.
+    """
+    errors = []
+    teams = Team.objects.annotate(actual_subtotal=_team_sum('score'), actual_max_total=_team_sum('rnd__max_score'))
+    for team in teams.order_by('pk'):
+        if team.subtotal != team.actual_subtotal or team.max_total != team.actual_max_total:
+            errors.append("Team %s: stored %s / %s, actual %s / %s" % (
+                team.team_name, team.subtotal, team.max_total, team.actual_subtotal, team.actual_max_total))
+    for rnd in Round.objects.annotate(actual_count=_round_count()).order_by('pk'):
+        if rnd.answered_count != rnd.actual_count:
+            errors.append("Round %s: stored %d answers, actual %d" % (rnd.round_name, rnd.answered_count, rnd.actual_count))
+    return errors
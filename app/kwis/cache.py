@@ -0,0 +1,66 @@
+"""
+Cache backends for the data version and the rendered charts.
+
+BoundedLocMemCache keeps the rendered charts of a process in memory, bounded by their total size.
+Charts of large sizes take many times the memory of small ones, so a number of entries alone does not
+bound the memory of the cache. Shared caches are bounded by their own server instead, e.g. the maxmemory of Redis.
+
+FileBasedCache shares the data version between processes through a directory, counting atomically.
+"""
+import os
+from contextlib import contextmanager
+
+from django.core.cache.backends import filebased
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.files import locks
+
+
+class BoundedLocMemCache(LocMemCache):
+    """
+    Local memory cache evicting the least recently used entries once the pickled values take more than
+    OPTIONS['MAX_BYTES'] bytes, next to culling by MAX_ENTRIES. An entry larger than the limit is not kept.
+    """
+    def __init__(self, name, params):
+        super().__init__(name, params)
+        options = params.get('OPTIONS', {})
+        self._max_bytes = int(options.get('MAX_BYTES', 64 * 1024 * 1024))
+
+    def _set(self, key, value, timeout=DEFAULT_TIMEOUT):
+        super()._set(key, value, timeout)
+        # Recently used entries are kept at the front, so the least recently used ones are popped from the end.
+        # Summing the sizes on every set is cheap for the hundreds of charts kept and stays right after incr().
+        size = sum(len(value) for value in self._cache.values())
+        while size > self._max_bytes and self._cache:
+            evicted, value = self._cache.popitem()
+            del self._expire_info[evicted]
+            size -= len(value)
+
+
+class FileBasedCache(filebased.FileBasedCache):
+    """
+    File based cache of which add() and incr() are atomic between processes, by holding a lock on a file
+    in the cache directory. Django's own incr() reads and writes the value separately, so concurrent increments get lost.
+    """
+    @contextmanager
+    def _locked(self):
+        self._createdir()
+        with open(os.path.join(self._dir, 'counters.lock'), 'ab') as f:
+            locks.lock(f, locks.LOCK_EX)
+            try:
+                yield
+            finally:
+                locks.unlock(f)
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        with self._locked():
+            return super().add(key, value, timeout, version)
+
+    def incr(self, key, delta=1, version=None):
+        with self._locked():
+            value = self.get(key, self._missing_key, version=version)
+            if value is self._missing_key:
+                raise ValueError("Key '%s' not found" % key)
+            # Written without expiry, like the data version is added; Django's incr() gives it the default timeout
+            self.set(key, value + delta, timeout=None, version=version)
+            return value + delta
@@ -0,0 +1,202 @@
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import BadRequest
+from django.http import HttpResponse
+from django.utils.translation import get_language
+
+from .timing import measure
+from .versioning import get_data_version
+
+
+class ChartCache:
+    """
+    Cache of rendered PNG charts, kept in the charts cache so that all processes can share them.
+
+    Charts are stored per (kind, object id, language, size) together with the data version they were rendered for.
+    A chart for an older version is a miss and gets replaced, so each chart is rendered once per data change.
+    As the data version is shared too, a change made through any process invalidates the charts of all of them.
+    """
+    def __init__(self, alias='charts'):
+        self.alias = alias
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._rendering = {}
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    @staticmethod
+    def make_key(key):
+        kind, args, language, *size = key
+        return ':'.join([kind, *(str(arg) for arg in args), language or '', *size])
+
+    def _get(self, key, version):
+        entry = self.cache.get(self.make_key(key))
+        if entry is None or entry[0] != version:
+            return None
+        return entry[1]
+
+    def get(self, key, version):
+        png = self._get(key, version)
+        with self._lock:
+            if png is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return png
+
+    def set(self, key, version, png):
+        self.cache.set(self.make_key(key), (version, png))
+
+    def get_or_render(self, key, version, render):
+        """
+        Return the cached chart, or render it. Concurrent requests for the same chart in this process
+        wait for a single render.
+        """
+        png = self.get(key, version)
+        if png is not None:
+            return png
+
+        with self._lock:
+            render_lock = self._rendering.setdefault(key, threading.Lock())
+        try:
+            with render_lock:
+                # Another request might have rendered the chart in the meantime
+                png = self._get(key, version)
+                if png is not None:
+                    return png
+
+                png = render()
+                if png is not None:
+                    self.set(key, version, png)
+                return png
+        finally:
+            with self._lock:
+                self._rendering.pop(key, None)
+
+    def stats(self):
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses}
+
+    def clear(self):
+        self.cache.clear()
+        with self._lock:
+            self.hits = 0
+            self.misses = 0
+
+
+chart_cache = ChartCache()
+
+
+# Size of charts as (width, height in inches, dots per inch), unless another size is requested
+DEFAULT_SIZE = (6.4, 4.8, 100)
+DEFAULT_SIZES = {'ranking_overview': (7, 7, 100)}
+
+
+def chart_size(kind, name=None):
+    """
+    Return the default size of a chart, or the size of the given name in KWIS_CHART_SIZES.
+    Other names are refused, so that requests cannot make the chart cache render and keep any size.
+    """
+    if not name:
+        return DEFAULT_SIZES.get(kind, DEFAULT_SIZE)
+    sizes = getattr(settings, 'KWIS_CHART_SIZES', {})
+    if name not in sizes:
+        raise BadRequest("Unknown chart size: %s" % name)
+    return tuple(sizes[name])
+
+
+def chart_response(request, kind, data):
+    """
+    Response with the chart rendered in the size requested with ?size=<name>, see chart_size.
+    """
+    size = chart_size(kind, request.GET.get('size'))
+    return HttpResponse(render_chart(kind, data, size), content_type='image/png')
+
+
+def cache_chart(kind):
+    """
+    Decorator for chart views, serving the PNG from the chart cache as long as the quiz data is unchanged.
+    Every size of a chart is cached apart.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            size = request.GET.get('size', '')
+            # Unknown sizes are refused before anything is cached
+            chart_size(kind, size)
+            key = (kind, args + tuple(kwargs.values()), get_language(), size)
+
+            def render():
+                response = view(request, *args, **kwargs)
+                # Only successful renders are kept
+                return response.content if response.status_code == 200 else None
+
+            png = chart_cache.get_or_render(key, get_data_version(), render)
+            if png is None:
+                # Let the view produce the error response
+                return view(request, *args, **kwargs)
+            return HttpResponse(png, content_type='image/png')
+        return wrapper
+    return decorator
+
+
+# Charts are rendered by a bounded pool of worker processes, so that rendering uses multiple cores
+# and does not hold up the process serving pages and websockets.
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    """
+    Return the pool of chart rendering processes, or None when charts are rendered in process.
+    """
+    global _executor
+    workers = getattr(settings, 'KWIS_CHART_WORKERS', 0)
+    if not workers:
+        return None
+    with _executor_lock:
+        if _executor is None:
+            # Workers are spawned rather than forked from a process running threads
+            _executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+        return _executor
+
+
+def shutdown_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=False, cancel_futures=True)
+            _executor = None
+
+
+def _render(kind, data, size):
+    # matplotlib is imported on the first chart, so that processes serving other pages never load it
+    from . import rendering
+    return rendering.render(kind, data, size)
+
+
+def render_chart(kind, data, size=None):
+    """
+    Render a chart from the given data to PNG bytes, see kwis.rendering, by default in its default size.
+    """
+    if size is None:
+        size = chart_size(kind)
+    with measure('chart'):
+        executor = get_executor()
+        if executor is None:
+            return _render(kind, data, size)
+        try:
+            return executor.submit(_render, kind, data, size).result()
+        except BrokenProcessPool:
+            # A worker died: start a new pool for next charts and render this one in process
+            shutdown_executor()
+            return _render(kind, data, size)
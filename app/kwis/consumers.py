@@ -1,20 +1,43 @@
-from channels.generic.websocket import WebsocketConsumer
-from asgiref.sync import async_to_sync
+from channels.generic.websocket import AsyncWebsocketConsumer
 import json
 
+from .metrics import refresh_metrics
 
-class RefreshConsumer(WebsocketConsumer):
-    def connect(self):
-        self.group_name = "refresh_group"
-        async_to_sync(self.channel_layer.group_add)(
-            self.group_name, self.channel_name
-        )
-        self.accept()
 
-    def disconnect(self, close_code):
-        async_to_sync(self.channel_layer.group_discard)(
-            self.group_name, self.channel_name
-        )
+class RefreshConsumer(AsyncWebsocketConsumer):
+    # Consumers only wait for broadcasts, so they run on the event loop and do not hold a thread each
+    group_name = "refresh_group"
 
-    def refresh_page(self, event):
-        self.send(text_data=json.dumps({"action": "refresh"}))
+    async def connect(self):
+        try:
+            await self.channel_layer.group_add(
+                self.group_name, self.channel_name
+            )
+        except Exception:
+            refresh_metrics.error()
+            raise
+        await self.accept()
+        refresh_metrics.connected()
+        self.counted = True
+
+    async def disconnect(self, close_code):
+        try:
+            await self.channel_layer.group_discard(
+                self.group_name, self.channel_name
+            )
+        except Exception:
+            refresh_metrics.error()
+            raise
+        finally:
+            # Clients that never connected were not counted
+            if getattr(self, 'counted', False):
+                refresh_metrics.disconnected()
+
+    async def refresh_page(self, event):
+        # The ranking update is serialized once by the sender
+        if "text" in event:
+            await self.send(text_data=event["text"])
+        else:
+            await self.send(text_data=json.dumps({"action": "refresh"}))
+        if "sent_at" in event:
+            refresh_metrics.delivered(event["sent_at"])
@@ -0,0 +1,80 @@
+import asyncio
+import json
+import statistics
+import time
+
+from channels.layers import get_channel_layer
+from channels.testing import WebsocketCommunicator
+from django.core.management.base import BaseCommand
+from django.test import override_settings
+
+from kwis.consumers import RefreshConsumer
+
+
+async def measure(connections, broadcasts, text):
+    """
+    Connect the given number of websocket clients to the refresh group and time broadcasts to all of them.
+    Returns the time to connect all clients and the fan-out latency of each broadcast, in seconds.
+    """
+    application = RefreshConsumer.as_asgi()
+    communicators = [WebsocketCommunicator(application, "/ws/refresh/") for i in range(connections)]
+
+    start = time.perf_counter()
+    await asyncio.gather(*(communicator.connect(timeout=60) for communicator in communicators))
+    connect_time = time.perf_counter() - start
+
+    channel_layer = get_channel_layer()
+    latencies = []
+    for i in range(broadcasts):
+        start = time.perf_counter()
+        await channel_layer.group_send(RefreshConsumer.group_name, {"type": "refresh_page", "text": text})
+        # Latency until the last client received the broadcast
+        await asyncio.gather(*(communicator.receive_from(timeout=60) for communicator in communicators))
+        latencies.append(time.perf_counter() - start)
+
+    await asyncio.gather(*(communicator.disconnect(timeout=60) for communicator in communicators))
+    return connect_time, latencies
+
+
+class Command(BaseCommand):
+    help = "Measure the fan-out latency of refresh broadcasts to many websocket clients, using the in-memory channel layer"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--connections', type=int, nargs='+', default=[100, 1000, 5000],
+                            help="Numbers of connected clients to measure with")
+        parser.add_argument('--broadcasts', type=int, default=5, help="Number of broadcasts per measurement")
+        parser.add_argument('--teams', type=int, default=150, help="Number of teams in the broadcast ranking")
+        parser.add_argument('--json', action='store_true', help="Output results as JSON")
+
+    def handle(self, *args, **options):
+        # A ranking update of realistic size
+        text = json.dumps({
+            'action': 'ranking',
+            'version': 1,
+            'quiz_name': "Benchmark",
+            'captions': {'en': "Ranking after Round 1", 'nl': "Rangschikking na Round 1"},
+            'hidden': 0,
+            'rows': [[i + 1, "Team %d" % i, "%d.0" % (1000 - i)] for i in range(options['teams'])],
+        })
+
+        results = []
+        layers = {'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer', 'CONFIG': {'capacity': 1000}}}
+        with override_settings(CHANNEL_LAYERS=layers):
+            for connections in options['connections']:
+                connect_time, latencies = asyncio.run(measure(connections, options['broadcasts'], text))
+                results.append({
+                    'connections': connections,
+                    'connect_seconds': connect_time,
+                    'fanout_median_seconds': statistics.median(latencies),
+                    'fanout_max_seconds': max(latencies),
+                })
+
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+
+        self.stdout.write("%12s %12s %14s %12s" % ("connections", "connect (s)", "fan-out p50 (ms)", "max (ms)"))
+        for result in results:
+            self.stdout.write("%12d %12.2f %16.1f %12.1f" % (
+                result['connections'], result['connect_seconds'],
+                result['fanout_median_seconds'] * 1000, result['fanout_max_seconds'] * 1000))
@@ -0,0 +1,141 @@
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, connections, transaction
+from django.db.backends.sqlite3.base import DatabaseWrapper
+
+from kwis.models import Answer, Round, Team
+
+ALIAS = 'bench_sqlite'
+
+# SQLite as configured by Django without any options
+DEFAULT_PROFILE = {'CONN_MAX_AGE': 0, 'CONN_HEALTH_CHECKS': False, 'OPTIONS': {}}
+
+
+def database_settings(name, profile):
+    settings_dict = dict(connections['default'].settings_dict)
+    settings_dict.update({'NAME': name, 'OPTIONS': {}}, **profile)
+    return settings_dict
+
+
+def create_database(settings_dict, teams, rounds):
+    wrapper = DatabaseWrapper(settings_dict, ALIAS)
+    connections[ALIAS] = wrapper
+    with wrapper.schema_editor() as editor:
+        for model in (Team, Round, Answer):
+            editor.create_model(model)
+    Team.objects.using(ALIAS).bulk_create(Team(team_name="Team %d" % i) for i in range(teams))
+    Round.objects.using(ALIAS).bulk_create(Round(round_name="Round %d" % i, max_score=10) for i in range(rounds))
+    wrapper.close()
+
+
+def read(alias):
+    # The queries building the score matrix, as done by the ranking and jury pages
+    list(Team.objects.using(alias).order_by('pk').values_list('id', 'team_name'))
+    list(Round.objects.using(alias).order_by('pk').values_list('id', 'round_name', 'max_score'))
+    list(Answer.objects.using(alias).values_list('team_id', 'rnd_id', 'score'))
+
+
+def write(alias, team_id, rnd_id):
+    # Entering a score like the vote view, without sending the model signals of the live quiz
+    score = random.randint(0, 100) / 10
+    with transaction.atomic(using=alias):
+        answers = Answer.objects.using(alias).filter(team_id=team_id, rnd_id=rnd_id)
+        if answers.exists():
+            answers.update(score=score)
+        else:
+            Answer.objects.using(alias).bulk_create([Answer(team_id=team_id, rnd_id=rnd_id, score=score)])
+
+
+def worker(settings_dict, operation, teams, rounds, stop, results):
+    """
+    Repeat an operation until stopped, handling each one like a request: the connection is closed
+    afterwards unless it is persistent.
+    """
+    connections[ALIAS] = DatabaseWrapper(settings_dict, ALIAS)
+    done, errors, latencies = 0, 0, []
+    while not stop.is_set():
+        start = time.perf_counter()
+        try:
+            if operation == 'read':
+                read(ALIAS)
+            else:
+                write(ALIAS, random.randint(1, teams), random.randint(1, rounds))
+            done += 1
+            latencies.append(time.perf_counter() - start)
+        except OperationalError:
+            # database is locked
+            errors += 1
+        connections[ALIAS].close_if_unusable_or_obsolete()
+    connections[ALIAS].close()
+    results.append((operation, done, errors, latencies))
+
+
+def measure(profile, readers, writers, duration, teams, rounds):
+    """
+    Run concurrent readers and writers on a new database file with the given profile.
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        settings_dict = database_settings(os.path.join(directory, 'bench.sqlite3'), profile)
+        create_database(settings_dict, teams, rounds)
+
+        stop, results = threading.Event(), []
+        threads = [threading.Thread(target=worker, args=(settings_dict, operation, teams, rounds, stop, results))
+                   for operation in ['read'] * readers + ['write'] * writers]
+        for thread in threads:
+            thread.start()
+        time.sleep(duration)
+        stop.set()
+        for thread in threads:
+            thread.join()
+
+    result = {}
+    for operation in ('read', 'write'):
+        done = sum(r[1] for r in results if r[0] == operation)
+        latencies = sorted(latency for r in results if r[0] == operation for latency in r[3])
+        result[operation] = {
+            'per_second': done / duration,
+            'errors': sum(r[2] for r in results if r[0] == operation),
+            'p95_ms': latencies[int(len(latencies) * 0.95)] * 1000 if latencies else None,
+        }
+    return result
+
+
+class Command(BaseCommand):
+    help = "Measure mixed read/write throughput of SQLite with default settings and with the concurrency profile"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--readers', type=int, default=8, help="Number of concurrent readers")
+        parser.add_argument('--writers', type=int, default=4, help="Number of concurrent writers")
+        parser.add_argument('--duration', type=float, default=5, help="Seconds to run each profile")
+        parser.add_argument('--teams', type=int, default=150)
+        parser.add_argument('--rounds', type=int, default=12)
+        parser.add_argument('--json', action='store_true', help="Output results as JSON")
+
+    def handle(self, *args, **options):
+        profiles = {'default': DEFAULT_PROFILE, 'concurrent': settings.KWIS_SQLITE_PROFILE}
+        results = {name: measure(profile, options['readers'], options['writers'], options['duration'],
+                                 options['teams'], options['rounds'])
+                   for name, profile in profiles.items()}
+
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+
+        self.stdout.write("%-12s %12s %8s %10s %12s %8s %10s" % (
+            "profile", "reads/s", "errors", "p95 (ms)", "writes/s", "errors", "p95 (ms)"))
+        for name, result in results.items():
+            self.stdout.write("%-12s %12.1f %8d %10s %12.1f %8d %10s" % (
+                name,
+                result['read']['per_second'], result['read']['errors'], format_ms(result['read']['p95_ms']),
+                result['write']['per_second'], result['write']['errors'], format_ms(result['write']['p95_ms'])))
+
+
+def format_ms(value):
+    return "-" if value is None else "%.1f" % value
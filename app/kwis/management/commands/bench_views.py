@@ -0,0 +1,186 @@
+import json
+import statistics
+import time
+import tracemalloc
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, reset_queries, transaction
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import URLPattern, get_resolver, reverse
+
+from kwis.charts import chart_cache
+from kwis.models import Round, Team
+from kwis.scores import as_committed, invalidate_score_matrix
+from kwis.transfer import import_records
+
+from .generate_quiz import generate_records
+
+# Views that change data or send messages are not measured
+SKIPPED_VIEWS = {'delete', 'reveal_next', 'trigger_refresh', 'api_scores', 'import_quiz'}
+
+
+class Rollback(Exception):
+    pass
+
+
+def view_urls(team_id, rnd_id):
+    """
+    Return (name, url) for every view of the kwis app, with the given team and round as arguments.
+    """
+    arguments = {'team_id': team_id, 'rnd_id': rnd_id, 'fmt': 'csv'}
+    urls = []
+    for pattern in get_resolver('kwis.urls').url_patterns:
+        if not isinstance(pattern, URLPattern):
+            continue
+        name = pattern.name or pattern.callback.__name__
+        if name in SKIPPED_VIEWS:
+            continue
+        kwargs = {key: arguments[key] for key in pattern.pattern.converters}
+        # Views serving several URLs, like the chart data, are told apart by the name of their URL
+        urls.append((name, reverse(pattern.name if pattern.default_args else pattern.callback, kwargs=kwargs)))
+    return urls
+
+
+def get(client, url):
+    response = client.get(url)
+    if response.status_code != 200:
+        raise CommandError("%s returned %d" % (url, response.status_code))
+    # Streamed responses are only produced while they are read
+    return b''.join(response.streaming_content) if response.streaming else response.content
+
+
+def reset_caches():
+    invalidate_score_matrix()
+    chart_cache.clear()
+
+
+def measure(client, url, repeat):
+    """
+    Measure a view the first time it is requested after a change, and when requested again.
+    """
+    reset_caches()
+    # Each request empties the query log, which must be empty already for the queries to be counted
+    reset_queries()
+    with CaptureQueriesContext(connection) as cold_queries:
+        start = time.perf_counter()
+        get(client, url)
+        cold = time.perf_counter() - start
+    # The captured queries are read from the log, before it is emptied again
+    cold_queries = len(cold_queries)
+
+    warm, warm_queries = [], 0
+    for i in range(repeat):
+        reset_queries()
+        with CaptureQueriesContext(connection) as queries:
+            start = time.perf_counter()
+            get(client, url)
+            warm.append(time.perf_counter() - start)
+        warm_queries += len(queries)
+
+    # Memory is traced apart, as tracing slows down everything
+    reset_caches()
+    tracemalloc.start()
+    try:
+        get(client, url)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    return {
+        'cold_ms': cold * 1000,
+        'warm_ms': statistics.median(warm) * 1000 if warm else None,
+        'cold_queries': cold_queries,
+        'warm_queries': warm_queries // repeat if repeat else None,
+        'peak_kib': peak / 1024,
+    }
+
+
+def compare(results, baseline, threshold):
+    """
+    Return lines describing views that got slower, more querying or more memory hungry than the baseline.
+    """
+    regressions = []
+    for name, result in results['views'].items():
+        before = baseline.get('views', {}).get(name)
+        if before is None:
+            continue
+        for metric in ('cold_ms', 'warm_ms', 'peak_kib'):
+            if result[metric] is not None and before.get(metric) and result[metric] > before[metric] * threshold:
+                regressions.append("%s: %s %.1f -> %.1f" % (name, metric, before[metric], result[metric]))
+        for metric in ('cold_queries', 'warm_queries'):
+            if result[metric] is not None and before.get(metric) is not None and result[metric] > before[metric]:
+                regressions.append("%s: %s %d -> %d" % (name, metric, before[metric], result[metric]))
+    return regressions
+
+
+class Command(BaseCommand):
+    help = "Measure time, SQL queries and peak memory of every kwis view, including the charts"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--teams', type=int, help="Measure on a generated quiz with this many teams, instead of the current data")
+        parser.add_argument('--rounds', type=int, default=12, help="Number of rounds of the generated quiz")
+        parser.add_argument('--completion', type=float, default=0.6, help="Fraction of complete rounds of the generated quiz")
+        parser.add_argument('--repeat', type=int, default=5, help="Number of warm requests per view")
+        parser.add_argument('--output', help="Write the results as JSON to this file")
+        parser.add_argument('--baseline', help="Compare with results written before, failing on regressions")
+        parser.add_argument('--threshold', type=float, default=1.25,
+                            help="Factor by which time or memory may exceed the baseline before it is a regression")
+        parser.add_argument('--json', action='store_true', help="Output results as JSON")
+
+    def handle(self, *args, **options):
+        # All changes, including a generated quiz, are rolled back afterwards
+        try:
+            # Caches work within the transaction like they do on committed data
+            with transaction.atomic(), as_committed():
+                results = self.run(options)
+                raise Rollback
+        except Rollback:
+            pass
+        finally:
+            reset_caches()
+
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(results, f, indent=2)
+
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2))
+        else:
+            self.stdout.write("%-20s %10s %10s %8s %8s %10s" % ("view", "cold (ms)", "warm (ms)", "queries", "warm q", "peak (KiB)"))
+            for name, result in results['views'].items():
+                self.stdout.write("%-20s %10.1f %10.1f %8d %8d %10.0f" % (
+                    name, result['cold_ms'], result['warm_ms'] or 0, result['cold_queries'], result['warm_queries'] or 0, result['peak_kib']))
+
+        if options['baseline']:
+            with open(options['baseline']) as f:
+                regressions = compare(results, json.load(f), options['threshold'])
+            for regression in regressions:
+                self.stderr.write(regression)
+            if regressions:
+                raise CommandError("%d regressions against %s" % (len(regressions), options['baseline']))
+            self.stdout.write("No regressions against %s" % options['baseline'])
+
+    def run(self, options):
+        if options['teams']:
+            import_records(generate_records(options['teams'], options['rounds'], options['completion'], seed=0), replace=True)
+
+        team, rnd = Team.objects.order_by('pk').first(), Round.objects.order_by('pk').first()
+        if team is None or rnd is None:
+            raise CommandError("There is no quiz to measure, use --teams or generate_quiz")
+
+        client = Client()
+        client.force_login(User.objects.create_superuser("kwis-benchmark", password=None))
+
+        results = {
+            'teams': Team.objects.count(),
+            'rounds': Round.objects.count(),
+            'repeat': options['repeat'],
+            'views': {},
+        }
+        # Charts are rendered in process, so that their time and memory are measured
+        with override_settings(ALLOWED_HOSTS=['testserver'], KWIS_CHART_WORKERS=0, KWIS_AUTO_REFRESH=False):
+            for name, url in view_urls(team.id, rnd.id):
+                results['views'][name] = measure(client, url, options['repeat'])
+        return results
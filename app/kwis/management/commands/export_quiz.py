@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from kwis.transfer import CHUNK_SIZE, FORMATS, export_lines, guess_format
+
+
+class Command(BaseCommand):
+    help = "Export the quiz, its teams, rounds and answers as CSV or JSON Lines"
+
+    def add_arguments(self, parser):
+        parser.add_argument('output', nargs='?', help="File to write to, standard output when omitted")
+        parser.add_argument('--format', choices=FORMATS, help="Output format, guessed from the file name by default")
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help="Number of rows fetched at a time")
+
+    def handle(self, *args, **options):
+        output = options['output']
+        fmt = options['format'] or (guess_format(output) if output else 'csv')
+        if fmt is None:
+            raise CommandError("Cannot tell the format of %s, use --format" % output)
+
+        if output is None:
+            for line in export_lines(fmt, options['chunk_size']):
+                self.stdout.write(line, ending='')
+            return
+
+        with open(output, 'w', encoding='utf-8', newline='') as f:
+            f.writelines(export_lines(fmt, options['chunk_size']))
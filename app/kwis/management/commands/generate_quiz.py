@@ -0,0 +1,59 @@
+import random
+
+from django.core.management.base import BaseCommand, CommandError
+
+from kwis.models import Answer, Round, Team
+from kwis.transfer import import_records
+
+MAX_SCORES = [10, 10, 15, 20, 25, 30]
+
+
+def generate_records(teams, rounds, completion=0.6, seed=None):
+    """
+    Yield the records of a quiz with the given number of teams and rounds, see kwis.transfer.
+    The first rounds, up to the completion fraction, have scores for all teams; the round after
+    that for about half of the teams, and later rounds have no scores yet.
+    """
+    rng = random.Random(seed)
+    yield {'kind': 'quiz', 'name': "Generated quiz (%d teams, %d rounds)" % (teams, rounds), 'value': 0}
+
+    team_names = ["Team %04d" % (i + 1) for i in range(teams)]
+    for name in team_names:
+        yield {'kind': 'team', 'name': name}
+
+    round_maxima = [rng.choice(MAX_SCORES) for i in range(rounds)]
+    for i, max_score in enumerate(round_maxima):
+        yield {'kind': 'round', 'name': "Round %02d" % (i + 1), 'value': max_score}
+
+    # Every team has a skill, which scores of the round vary around
+    skills = [rng.betavariate(4, 3) for name in team_names]
+    complete = int(rounds * completion)
+    for i, max_score in enumerate(round_maxima[:complete + 1]):
+        for name, skill in zip(team_names, skills):
+            if i == complete and rng.random() < 0.5:
+                continue
+            score = min(max(rng.gauss(skill, 0.15), 0), 1) * max_score
+            yield {'kind': 'answer', 'team': name, 'round': "Round %02d" % (i + 1), 'value': round(score * 2) / 2}
+
+
+class Command(BaseCommand):
+    help = "Replace all quiz data by a generated quiz of the given size, for testing and benchmarks. Asks before removing existing data."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--teams', type=int, default=150, help="Number of teams")
+        parser.add_argument('--rounds', type=int, default=12, help="Number of rounds")
+        parser.add_argument('--completion', type=float, default=0.6, help="Fraction of rounds with all scores entered")
+        parser.add_argument('--seed', type=int, help="Seed for the random scores, to generate the same quiz again")
+        parser.add_argument('--noinput', '--no-input', action='store_false', dest='interactive',
+                            help="Replace existing teams, rounds and answers without asking")
+
+    def handle(self, *args, **options):
+        if options['teams'] < 1 or options['rounds'] < 1 or not 0 <= options['completion'] <= 1:
+            raise CommandError("A quiz needs teams and rounds, and completion is a fraction")
+        if options['interactive'] and (Team.objects.exists() or Round.objects.exists() or Answer.objects.exists()):
+            confirm = input("This removes all teams, rounds and answers in the database. Type 'yes' to continue, or 'no' to cancel: ")
+            if confirm != 'yes':
+                raise CommandError("Generating a quiz cancelled, the data is left as it was")
+        counts = import_records(generate_records(options['teams'], options['rounds'], options['completion'], options['seed']),
+                                replace=True)
+        self.stdout.write("Generated %(team)d teams, %(round)d rounds and %(answer)d answers" % counts)
@@ -0,0 +1,32 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from kwis.transfer import CHUNK_SIZE, FORMATS, TransferError, guess_format, import_records, read_records
+
+
+class Command(BaseCommand):
+    help = "Import a quiz, its teams, rounds and answers from CSV or JSON Lines, as written by export_quiz"
+
+    def add_arguments(self, parser):
+        parser.add_argument('input', help="File to read from, - for standard input")
+        parser.add_argument('--format', choices=FORMATS, help="Input format, guessed from the file name by default")
+        parser.add_argument('--replace', action='store_true', help="Remove all teams, rounds and answers first")
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help="Number of objects written at a time")
+
+    def handle(self, *args, **options):
+        source = options['input']
+        fmt = options['format'] or guess_format(source)
+        if fmt is None:
+            raise CommandError("Cannot tell the format of %s, use --format" % source)
+
+        try:
+            if source == '-':
+                counts = import_records(read_records(sys.stdin, fmt), options['replace'], options['chunk_size'])
+            else:
+                with open(source, encoding='utf-8', newline='') as f:
+                    counts = import_records(read_records(f, fmt), options['replace'], options['chunk_size'])
+        except (OSError, UnicodeDecodeError, TransferError) as e:
+            raise CommandError(e)
+
+        self.stdout.write("Imported %(quiz)d quiz, %(team)d teams, %(round)d rounds and %(answer)d answers" % counts)
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from kwis.prerender import all_charts, chart_root, prerender_charts
+
+
+class Command(BaseCommand):
+    help = "Render all charts for the current quiz data to files below MEDIA_ROOT, served by the web server"
+
+    def handle(self, *args, **options):
+        rendered = prerender_charts()
+        self.stdout.write("Rendered %d of %d charts to %s" % (rendered, len(all_charts()), chart_root()))
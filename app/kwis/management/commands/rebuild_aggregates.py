@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from kwis import aggregates
+from kwis.scores import invalidate_score_matrix
+
+
+class Command(BaseCommand):
+    help = "Recompute the totals stored on teams and the answer counts stored on rounds, and verify them"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--verify', action='store_true', help="Only report aggregates that are wrong, without fixing them")
+
+    def handle(self, *args, **options):
+        if not options['verify']:
+            aggregates.rebuild()
+            invalidate_score_matrix()
+
+        errors = aggregates.verify()
+        for error in errors:
+            self.stderr.write(error)
+        if errors:
+            raise CommandError("%d aggregates are wrong" % len(errors))
+        self.stdout.write("All aggregates are correct")
@@ -0,0 +1,101 @@
+"""
+Metrics of the websocket refresh path, exposed in the Prometheus text format.
+
+Every process counts the websocket clients it serves and the broadcasts it sends. Broadcasts carry the time
+they were sent, so the consumers can measure how long it took until the update was sent to their client.
+Metrics are kept per process and are meant to be scraped from each of them.
+"""
+import threading
+import time
+
+from .timing import Histogram
+
+# Buckets for the time from sending a broadcast until it was sent to a client, in seconds
+DELIVERY_BOUNDS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0]
+
+
+class RefreshMetrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.clear()
+
+    def clear(self):
+        with self._lock:
+            self.connections = 0
+            self.connects = 0
+            self.disconnects = 0
+            self.broadcasts = 0
+            self.errors = 0
+            self.deliveries = Histogram(DELIVERY_BOUNDS)
+            # Time until the last client received the most recent broadcast seen by this process
+            self.last_broadcast = None
+            self.last_fanout = 0.0
+
+    def connected(self):
+        with self._lock:
+            self.connections += 1
+            self.connects += 1
+
+    def disconnected(self):
+        with self._lock:
+            self.connections -= 1
+            self.disconnects += 1
+
+    def broadcast_sent(self):
+        with self._lock:
+            self.broadcasts += 1
+
+    def error(self):
+        with self._lock:
+            self.errors += 1
+
+    def delivered(self, sent_at):
+        """
+        Record that a broadcast, sent at the given time.time(), was sent to a client.
+        """
+        delay = max(0.0, time.time() - sent_at)
+        with self._lock:
+            self.deliveries.add(delay)
+            if sent_at != self.last_broadcast:
+                self.last_broadcast = sent_at
+                self.last_fanout = delay
+            else:
+                self.last_fanout = max(self.last_fanout, delay)
+
+    def render(self):
+        """
+        Return the metrics in the Prometheus text exposition format.
+        """
+        with self._lock:
+            lines = [
+                "# HELP kwis_websocket_connections Websocket clients connected to the refresh group.",
+                "# TYPE kwis_websocket_connections gauge",
+                "kwis_websocket_connections %d" % self.connections,
+                "# HELP kwis_websocket_connects_total Websocket clients that connected.",
+                "# TYPE kwis_websocket_connects_total counter",
+                "kwis_websocket_connects_total %d" % self.connects,
+                "# HELP kwis_websocket_disconnects_total Websocket clients that disconnected.",
+                "# TYPE kwis_websocket_disconnects_total counter",
+                "kwis_websocket_disconnects_total %d" % self.disconnects,
+                "# HELP kwis_refresh_broadcasts_total Refresh broadcasts sent to the refresh group.",
+                "# TYPE kwis_refresh_broadcasts_total counter",
+                "kwis_refresh_broadcasts_total %d" % self.broadcasts,
+                "# HELP kwis_channel_layer_errors_total Failed channel layer operations.",
+                "# TYPE kwis_channel_layer_errors_total counter",
+                "kwis_channel_layer_errors_total %d" % self.errors,
+                "# HELP kwis_refresh_delivery_seconds Time from sending a broadcast until it was sent to a client.",
+                "# TYPE kwis_refresh_delivery_seconds histogram",
+            ]
+            for bound, count in self.deliveries.cumulative_counts():
+                lines.append('kwis_refresh_delivery_seconds_bucket{le="%s"} %d' % ("+Inf" if bound == float('inf') else bound, count))
+            lines += [
+                "kwis_refresh_delivery_seconds_sum %f" % self.deliveries.total,
+                "kwis_refresh_delivery_seconds_count %d" % self.deliveries.count,
+                "# HELP kwis_refresh_last_fanout_seconds Time until the last client received the latest broadcast.",
+                "# TYPE kwis_refresh_last_fanout_seconds gauge",
+                "kwis_refresh_last_fanout_seconds %f" % self.last_fanout,
+            ]
+        return "\n".join(lines) + "\n"
+
+
+refresh_metrics = RefreshMetrics()
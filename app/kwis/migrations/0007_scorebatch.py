@@ -0,0 +1,26 @@
+# Generated by Django 5.2.12 on 2026-10-18 08:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('kwis', '0006_alter_quiz_options_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ScoreBatch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('idempotency_key', models.CharField(max_length=200, unique=True)),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('response', models.JSONField()),
+            ],
+            options={
+                'verbose_name': 'Score batch',
+                'verbose_name_plural': 'Score batches',
+            },
+        ),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 5.2.12 on 2026-10-18 08:22
+
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+def fill_aggregates(apps, schema_editor):
+    Answer = apps.get_model('kwis', 'Answer')
+    Team = apps.get_model('kwis', 'Team')
+    Round = apps.get_model('kwis', 'Round')
+
+    def team_sum(field):
+        answers = Answer.objects.filter(team=OuterRef('pk')).order_by().values('team')
+        output_field = models.DecimalField(max_digits=8, decimal_places=1)
+        return Coalesce(Subquery(answers.annotate(total=Sum(field)).values('total'), output_field=output_field),
+                        Value(Decimal(0)), output_field=output_field)
+
+    answers = Answer.objects.filter(rnd=OuterRef('pk')).order_by().values('rnd')
+    Team.objects.update(subtotal=team_sum('score'), max_total=team_sum('rnd__max_score'))
+    Round.objects.update(answered_count=Coalesce(Subquery(answers.annotate(count=Count('pk')).values('count'),
+                                                          output_field=models.IntegerField()), Value(0)))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('kwis', '0007_scorebatch'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='round',
+            name='answered_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='team',
+            name='max_total',
+            field=models.DecimalField(decimal_places=1, default=0, editable=False, max_digits=8),
+        ),
+        migrations.AddField(
+            model_name='team',
+            name='subtotal',
+            field=models.DecimalField(decimal_places=1, default=0, editable=False, max_digits=8),
+        ),
+        migrations.RunPython(fill_aggregates, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.12 on 2026-10-18 09:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('kwis', '0008_team_totals_round_answered_count'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='scorebatch',
+            name='request_hash',
+            field=models.CharField(blank=True, default='', max_length=64),
+        ),
+    ]
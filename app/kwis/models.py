@@ -6,6 +6,20 @@ from django.utils.translation import gettext_lazy as _
 # - Teams participating
 # - Rounds in the quiz
 # - Answered score per round for each team
+# - Batches of scores received through the API
+
+
+class StoredAggregates:
+    """
+    Saving a model loaded earlier leaves its aggregate fields alone, as they may have changed in the meantime.
+    """
+    aggregate_fields = []
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding and kwargs.get('update_fields') is None and not kwargs.get('force_insert'):
+            kwargs['update_fields'] = [field.name for field in self._meta.concrete_fields
+                                       if not field.primary_key and field.name not in self.aggregate_fields]
+        super().save(*args, **kwargs)
 
 
 class Quiz(models.Model):
@@ -20,9 +34,13 @@ class Quiz(models.Model):
         verbose_name_plural = _('Quizzes')
 
 
-class Team(models.Model):
+class Team(StoredAggregates, models.Model):
     # A team only needs a name for identification
     team_name = models.CharField(max_length=200, unique=True)
+    # Totals of the answers of the team, maintained by kwis.aggregates
+    subtotal = models.DecimalField(max_digits=8, decimal_places=1, default=0, editable=False)
+    max_total = models.DecimalField(max_digits=8, decimal_places=1, default=0, editable=False)
+    aggregate_fields = ['subtotal', 'max_total']
 
     def __str__(self):
         return self.team_name
@@ -33,10 +51,13 @@ class Team(models.Model):
         verbose_name_plural = _('Teams')
 
 
-class Round(models.Model):
+class Round(StoredAggregates, models.Model):
     # Each round has a name and a maximal score
     round_name = models.CharField(max_length=200, unique=True)
     max_score = models.DecimalField(max_digits=6, decimal_places=1)
+    # Number of answers for the round, maintained by kwis.aggregates
+    answered_count = models.PositiveIntegerField(default=0, editable=False)
+    aggregate_fields = ['answered_count']
 
     def __str__(self):
         return self.round_name + ": " + str(self.max_score)
@@ -66,3 +87,19 @@ class Answer(models.Model):
                 violation_error_message=_("A team can only have one answer per round.")
             ),
         ]
+
+
+class ScoreBatch(models.Model):
+    # A batch of scores received through the API, identified by the idempotency key given by the client
+    idempotency_key = models.CharField(max_length=200, unique=True)
+    # SHA-256 of the request body, to refuse a key that is used again for another batch
+    request_hash = models.CharField(max_length=64, blank=True, default='')
+    created = models.DateTimeField(auto_now_add=True)
+    response = models.JSONField()
+
+    def __str__(self):
+        return self.idempotency_key
+
+    class Meta:
+        verbose_name = _('Score batch')
+        verbose_name_plural = _('Score batches')
@@ -0,0 +1,196 @@
+"""
+Pre-rendering of all charts to files, enabled with KWIS_PRERENDER_CHARTS.
+
+After the quiz data changed, all charts are rendered for the new data version, in every language, to a
+directory of their own below MEDIA_ROOT/charts, from where the web server serves them with long cache headers.
+Pages link to these files once they exist, and to the chart views until then. Charts whose data did not
+change since the previous version are linked to the file rendered before instead of being rendered again.
+"""
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.urls import reverse
+from django.utils import translation
+
+from .charts import render_chart
+from .models import Round, Team
+from .versioning import get_data_version
+from .websocket_utils import RefreshScheduler
+
+MANIFEST = 'manifest.json'
+
+_lock = threading.Lock()
+
+
+def chart_root():
+    return os.path.join(settings.MEDIA_ROOT, 'charts')
+
+
+def chart_name(kind, args):
+    return '-'.join([kind, *(str(arg) for arg in args)]) + '.png'
+
+
+def version_directory(version, language):
+    return '%s-%s' % (version, language)
+
+
+def _charts():
+    # The views are imported on use, as they import the signals scheduling the pre-rendering
+    from . import views
+    return {
+        'team_overview': (views.team_overview, views.team_overview_data),
+        'rnd_overview': (views.rnd_overview, views.rnd_overview_data),
+        'ranking_overview': (views.ranking_overview, views.ranking_overview_data),
+        'rnd_result': (views.rnd_result, views.rnd_result_data),
+        'team_result': (views.team_result, views.team_result_data),
+    }
+
+
+def all_charts():
+    """
+    Return (kind, args) of every chart of the quiz.
+    """
+    charts = [('team_overview', ()), ('rnd_overview', ()), ('ranking_overview', ())]
+    charts += [('rnd_result', (pk,)) for pk in Round.objects.order_by('pk').values_list('pk', flat=True)]
+    charts += [('team_result', (pk,)) for pk in Team.objects.order_by('pk').values_list('pk', flat=True)]
+    return charts
+
+
+def chart_url(kind, *args):
+    """
+    Return the URL of the chart pre-rendered for the current data version and language,
+    or of the view rendering it when it is not pre-rendered (yet).
+    """
+    if getattr(settings, 'KWIS_PRERENDER_CHARTS', False):
+        language = translation.get_supported_language_variant(translation.get_language() or settings.LANGUAGE_CODE)
+        directory, name = version_directory(get_data_version(), language), chart_name(kind, args)
+        if os.path.exists(os.path.join(chart_root(), directory, name)):
+            return '%scharts/%s/%s' % (settings.MEDIA_URL, directory, name)
+    return reverse(_charts()[kind][0], args=args)
+
+
+def _versions(root):
+    """
+    Return {language: [(version, directory name)]} of the pre-rendered charts, newest first.
+    """
+    versions = {}
+    for name in os.listdir(root):
+        version, _, language = name.partition('-')
+        if version.isdigit():
+            versions.setdefault(language, []).append((int(version), name))
+    for entries in versions.values():
+        entries.sort(reverse=True)
+    return versions
+
+
+def _link(source, destination):
+    try:
+        os.link(source, destination)
+    except OSError:
+        shutil.copyfile(source, destination)
+
+
+def _render_directory(root, directory, charts, previous):
+    """
+    Render the charts in the active language to the given directory, which appears once all charts are in it.
+    Charts with the same data as in the previous directory are linked to the files in there.
+    Return the number of charts rendered.
+    """
+    functions = _charts()
+    previous_manifest = {}
+    if previous is not None:
+        with open(os.path.join(root, previous, MANIFEST)) as f:
+            previous_manifest = json.load(f)
+
+    manifest, renders = {}, []
+    temporary = tempfile.mkdtemp(prefix='.', dir=root)
+    # Charts are rendered concurrently, to keep all chart workers busy
+    pool = ThreadPoolExecutor(max_workers=max(1, getattr(settings, 'KWIS_CHART_WORKERS', 0)))
+    try:
+        for kind, args in charts:
+            data = functions[kind][1](*args)
+            digest = hashlib.sha256(json.dumps(data, sort_keys=True).encode()).hexdigest()
+            name = chart_name(kind, args)
+            if previous_manifest.get(name) == digest:
+                _link(os.path.join(root, previous, name), os.path.join(temporary, name))
+            else:
+                renders.append((name, pool.submit(render_chart, kind, data)))
+            manifest[name] = digest
+        for name, render in renders:
+            with open(os.path.join(temporary, name), 'wb') as f:
+                f.write(render.result())
+        with open(os.path.join(temporary, MANIFEST), 'w') as f:
+            json.dump(manifest, f)
+        # The web server reads the directory, which is created readable by its owner only
+        os.chmod(temporary, 0o755)
+        try:
+            os.rename(temporary, os.path.join(root, directory))
+        except OSError:
+            if not os.path.isdir(os.path.join(root, directory)):
+                raise
+            # Rendered by another process in the meantime
+            shutil.rmtree(temporary, ignore_errors=True)
+    except BaseException:
+        shutil.rmtree(temporary, ignore_errors=True)
+        raise
+    finally:
+        pool.shutdown(cancel_futures=True)
+    return len(renders)
+
+
+def prerender_charts():
+    """
+    Render all charts for the current data version in every language, unless done already.
+    Older versions are removed, except the one before, which pages shown before the change might still use.
+    Return the number of charts rendered.
+    """
+    with _lock:
+        root = chart_root()
+        os.makedirs(root, exist_ok=True)
+        # The version is read before the data, so that charts never get a version older than their data
+        version = get_data_version()
+        charts = all_charts()
+
+        rendered = 0
+        versions = _versions(root)
+        for language, _ in settings.LANGUAGES:
+            directory = version_directory(version, language)
+            entries = versions.get(language, [])
+            if any(name == directory for _, name in entries):
+                continue
+            previous = next((name for v, name in entries if v < version), None)
+            with translation.override(language):
+                rendered += _render_directory(root, directory, charts, previous)
+
+        for entries in _versions(root).values():
+            for v, name in entries[2:]:
+                shutil.rmtree(os.path.join(root, name), ignore_errors=True)
+        return rendered
+
+
+class PrerenderScheduler(RefreshScheduler):
+    """
+    Coalesces changes to the quiz data into a single pre-rendering of the charts.
+    """
+    debounce_setting = ('KWIS_PRERENDER_DEBOUNCE', 1.0)
+    max_delay_setting = ('KWIS_PRERENDER_MAX_DELAY', 5.0)
+
+    def run(self):
+        prerender_charts()
+
+
+prerender_scheduler = PrerenderScheduler()
+
+
+def schedule_prerender():
+    """
+    Schedule a coalesced pre-rendering of all charts, see PrerenderScheduler.
+    """
+    if getattr(settings, 'KWIS_PRERENDER_CHARTS', False):
+        prerender_scheduler.schedule()
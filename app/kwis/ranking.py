@@ -0,0 +1,234 @@
+from decimal import Decimal
+from typing import NamedTuple
+
+import numpy as np
+from django.conf import settings
+from django.utils import translation
+from django.utils.translation import gettext as _
+
+from .models import Quiz
+from .scores import from_tenths, get_score_matrix
+
+
+class RoundProgress(NamedTuple):
+    """
+    Completion state of a single round.
+    """
+    id: int
+    round_name: str
+    max_score: Decimal
+    answer_count: int
+    team_count: int
+
+    @property
+    def complete(self):
+        # A completed round has as much answers as there are participating teams
+        return self.answer_count == self.team_count
+
+
+class QuizProgress:
+    """
+    Completion state of all rounds in the quiz, in round order.
+    """
+    def __init__(self, rounds):
+        self.rounds = rounds
+        self.completed = [rnd for rnd in rounds if rnd.complete]
+
+    @property
+    def all_complete(self):
+        return len(self.completed) == len(self.rounds)
+
+    def __iter__(self):
+        return iter(self.rounds)
+
+    def __len__(self):
+        return len(self.rounds)
+
+
+def get_round_progress(matrix=None):
+    """
+    Return the progress of every round, taken from the score matrix.
+    The answer count of each round is compared against the number of teams to detect completed rounds.
+    """
+    if matrix is None:
+        matrix = get_score_matrix()
+
+    team_count = len(matrix.teams)
+    answer_counts = matrix.round_answer_counts()
+
+    return QuizProgress([RoundProgress(rnd.id, rnd.round_name, rnd.max_score, int(answer_count), team_count)
+                         for rnd, answer_count in zip(matrix.rounds, answer_counts)])
+
+
+def assign_ranks(results):
+    """
+    Sort (name, total) tuples on total score and give each a rank, allowing for ex aequo scores.
+    Teams with an equal total share the best rank; the next total skips the shared places.
+    """
+    # Sort is stable, so ex aequo teams keep the order in which they were given
+    sorted_results = sorted(results, reverse=True, key=lambda tup: tup[1])
+
+    rank, count, previous, ranking = 0, 0, None, []
+    for key, num in sorted_results:
+        count += 1
+        if num != previous:
+            rank += count
+            previous = num
+            count = 0
+        ranking.append((rank, key, num))
+
+    return ranking
+
+
+def get_ranked_results(completed_rounds, matrix=None):
+    """
+    For the rounds given in completed_rounds, calculate the total score for each team.
+    Then all teams are sorted on total score and are given a ranking to allow for ex aequo scores.
+    The totals are summed from the score matrix.
+    """
+    if matrix is None:
+        matrix = get_score_matrix()
+
+    cols = [matrix.round_index[rnd.id] for rnd in completed_rounds]
+    totals = matrix.scores[:, cols].sum(axis=1)
+    # Teams without answers in complete rounds have no sum
+    has_answers = matrix.answered[:, cols].any(axis=1)
+
+    results = []
+    for team, total, answered in zip(matrix.teams, totals, has_answers):
+        results.append((team.team_name, from_tenths(total) if answered else 0))
+
+    return assign_ranks(results)
+
+
+def get_caption(progress):
+    """
+    Caption of the ranking, telling which rounds it is based on.
+    """
+    if progress.all_complete:
+        # Translators: This indicates all scores for all rounds have been entered
+        caption = _("Final ranking")
+    elif len(progress.completed) == 0:
+        # Translators: This indicates no round has all scores entered
+        caption = _("No results yet")
+    else:
+        caption = _("Ranking after ")
+        for rnd in progress.completed:
+            caption += rnd.round_name + ", "
+        caption = caption[:-2]  # Remove final ", "
+    return caption
+
+
+def get_ranking(matrix=None):
+    """
+    Return the ranking as shown to contestants: the ranked results, their caption and the number of hidden places.
+    """
+    if matrix is None:
+        matrix = get_score_matrix()
+
+    # First identify completed rounds.
+    progress = get_round_progress(matrix)
+    quiz = Quiz.objects.first()
+
+    # Nothing to hide
+    hidden = 0
+
+    if progress.all_complete:
+        # Hiding the final top 3 from the ranking view for dramatic effect
+        hidden = max(0, 3 - quiz.reveal_count) if quiz else 3
+
+    return {
+        'sorted': get_ranked_results(progress.completed, matrix),
+        'caption': get_caption(progress),
+        'hidden': hidden,
+        'quiz_name': quiz.name if quiz else "",
+        'progress': progress,
+        'version': matrix.version,
+    }
+
+
+def get_ranking_update():
+    """
+    Return the ranking as a message for the ranking pages, which update their table with it.
+    Hidden places only carry their rank and captions are given for every language.
+    """
+    ranking = get_ranking()
+
+    captions = {}
+    for language, name in settings.LANGUAGES:
+        with translation.override(language):
+            captions[language] = get_caption(ranking['progress'])
+
+    rows = []
+    for place, (rank, name, score) in enumerate(ranking['sorted']):
+        if place < ranking['hidden']:
+            rows.append([rank, "???", "???"])
+        else:
+            rows.append([rank, name, str(score)])
+
+    return {
+        'action': 'ranking',
+        'version': ranking['version'],
+        'quiz_name': ranking['quiz_name'],
+        'captions': captions,
+        'hidden': ranking['hidden'],
+        'rows': rows,
+    }
+
+
+def rank_columns(totals):
+    """
+    Rank the rows of a (teams x rounds) array of totals within every column, allowing for ex aequo scores.
+    Equal totals share the best rank, like in assign_ranks.
+    Returns the ranks and, per column, the row indices sorted from first to last place.
+    """
+    # Stable sort keeps ex aequo teams in their original order
+    order = np.argsort(-totals, axis=0, kind='stable')
+    ordered = np.take_along_axis(totals, order, axis=0)
+
+    # A new rank starts where the total differs from the previous place; ex aequo places repeat that start
+    places = np.arange(totals.shape[0]).reshape(-1, 1)
+    changed = np.ones(ordered.shape, dtype=bool)
+    changed[1:] = ordered[1:] != ordered[:-1]
+    starts = np.maximum.accumulate(np.where(changed, places, 0), axis=0)
+
+    ranks = np.empty(totals.shape, dtype=np.int64)
+    np.put_along_axis(ranks, order, starts + 1, axis=0)
+    return ranks, order
+
+
+class RankingHistory(NamedTuple):
+    """
+    Ranking of all teams after each completed round.
+    ranks and totals have one row per team and one column per completed round.
+    """
+    team_names: list
+    round_names: list
+    totals: np.ndarray
+    ranks: np.ndarray
+    order: np.ndarray
+
+    def top(self, n):
+        """
+        Return the row indices of the n best teams after the last round.
+        """
+        if not self.round_names:
+            return np.arange(0)
+        return self.order[:n, -1]
+
+
+def get_ranking_history(completed_rounds, matrix=None):
+    """
+    Calculate the ranking after each of the given completed rounds.
+    The scores of all teams for these rounds are summed cumulatively per round
+    and every intermediate ranking is computed at once.
+    """
+    if matrix is None:
+        matrix = get_score_matrix()
+
+    cols = [matrix.round_index[rnd.id] for rnd in completed_rounds]
+    totals = np.cumsum(matrix.scores[:, cols], axis=1)
+    ranks, order = rank_columns(totals)
+
+    return RankingHistory([team.team_name for team in matrix.teams],
+                          [rnd.round_name for rnd in completed_rounds], totals, ranks, order)
@@ -0,0 +1,208 @@
+"""
+Rendering of charts to PNG images.
+
+The render functions only take plain data (numbers, strings and lists) and do not depend on Django,
+so they can run in separate worker processes. Figures are created without pyplot: no global state is
+kept and figures are released as soon as they are rendered.
+"""
+import io
+
+import matplotlib as mpl
+mpl.use('Agg')  # make sure no X backend is used
+
+import numpy as np  # noqa: E402
+from matplotlib.backends.backend_agg import FigureCanvasAgg as FigureCanvas  # noqa: E402
+from matplotlib.figure import Figure  # noqa: E402
+
+# Dictionary to define color usage in graphs
+colors = {'score_good': 'green',
+          'score_bad': 'red',
+          'empty': 'lightblue',
+          }
+
+
+def dynamic_rotation(nbObjects):
+    if nbObjects <= 5:
+        return "horizontal"
+    else:
+        # return "vertical"
+        return 30
+
+
+def new_figure(size):
+    width, height, dpi = size
+    return Figure(figsize=(width, height), dpi=dpi)
+
+
+def print_png(fig):
+    buffer = io.BytesIO()
+    FigureCanvas(fig).print_png(buffer)
+    return buffer.getvalue()
+
+
+def team_result(data, size):
+    """
+    Plot results per team
+    """
+    # Set number of vertical bars
+    ind = np.arange(len(data['scores']))
+
+    # The image
+    fig = new_figure(size)
+    ax = fig.subplots(1, 1)
+    fig.set_tight_layout(True)
+
+    # Draw vertical bars
+    width = 0.25
+    ax.bar(ind, data['scores'], width, color=colors['score_good'])
+    ax.bar(ind, data['maxima'], width, color=colors['score_bad'], bottom=data['scores'])
+
+    # Set labels
+    ax.set_xticks(ind)
+    ax.set_xticklabels(data['names'], rotation=dynamic_rotation(data['round_count']), ha='right')
+    ax.set_xlabel(data['labels']['x'])
+    ax.set_ylabel(data['labels']['y'])
+
+    ax.grid(True)
+    return print_png(fig)
+
+
+def rnd_result(data, size):
+    """
+    Plot results per round
+    """
+    # Set number of vertical bars
+    ind = np.arange(len(data['scores']))
+
+    # The image
+    fig = new_figure(size)
+    ax = fig.subplots(1, 1)
+    fig.set_tight_layout(True)
+
+    # Draw vertical bar
+    width = 0.25
+    ax.barh(ind, data['scores'], width, color=colors['score_good'])
+
+    # Set labels
+    ax.set_yticks(ind)
+    ax.set_yticklabels(data['names'])
+    ax.set_ylabel(data['labels']['y'])
+    ax.set_xlabel(data['labels']['x'])
+
+    ax.grid(True)
+    return print_png(fig)
+
+
+def team_overview(data, size):
+    """
+    Plot overview of all teams
+    """
+    ind = np.arange(len(data['names']))
+
+    # The image
+    fig = new_figure(size)
+    ax = fig.subplots(1, 1)
+    fig.set_tight_layout(True)  # Ensure labels fit in image
+
+    # Draw bars
+    width = 0.5
+    ax.bar(ind, data['subtotals'], width, color=colors['score_good'])
+    ax.bar(ind, data['maxtotals'], width, color=colors['score_bad'], bottom=data['subtotals'])
+
+    # Set labels
+    ax.set_xticks(ind)
+    ax.set_xticklabels(data['names'], rotation=dynamic_rotation(len(data['names'])), ha='right')
+    ax.set_xlabel(data['labels']['x'])
+    ax.set_ylabel(data['labels']['y'])
+
+    ax.grid(True)
+
+    for tl in ax.get_yticklabels():
+        tl.set_color(colors['score_good'])
+
+    return print_png(fig)
+
+
+def rnd_overview(data, size):
+    """
+    Plot overview of all rounds
+    """
+    # Number of bars
+    ind = np.arange(len(data['names']))
+
+    # The image
+    fig = new_figure(size)
+    ax1 = fig.subplots(1, 1)
+    fig.set_tight_layout(True)  # Ensure labels fit in image
+    ax2 = ax1.twinx()
+
+    # Draw bars
+    barwidth = 0.5
+    boxwidth = barwidth / 2
+    barlocation = ind
+    ax1.bar(barlocation, data['scores'], barwidth, color=colors['score_good'])
+    ax1.bar(barlocation, data['difference'], barwidth, color=colors['score_bad'], bottom=data['scores'])
+    ax1.bar(barlocation, data['remaining'], barwidth, color=colors['empty'], bottom=data['maxima'])
+    # Boxes are drawn from their statistics, for the rounds with answers
+    positions = [i for i, box in enumerate(data['boxes']) if box is not None]
+    if positions:
+        ax2.bxp([data['boxes'][i] for i in positions], widths=boxwidth, positions=positions, showmeans=True)
+
+    # Set labels
+    ax1.set_xticks(ind)
+    ax1.set_xticklabels(data['names'], rotation=dynamic_rotation(len(data['names'])), ha='right')
+    ax1.set_xlabel(data['labels']['x'])
+    ax1.set_ylabel(data['labels']['y'])
+    ax2.set_ylabel(data['labels']['y2'])
+    ax2.set_ylim([0, 1])
+
+    ax1.grid(True)
+
+    for tl in ax1.get_yticklabels():
+        tl.set_color(colors['score_good'])
+
+    for tl in ax2.get_yticklabels():
+        tl.set_color(colors['score_bad'])
+
+    return print_png(fig)
+
+
+def ranking_overview(data, size):
+    """
+    Show history of rankings for top N teams in current ranking
+    """
+    # The image
+    fig = new_figure(size)
+    ax1 = fig.subplots(1, 1)
+    fig.set_tight_layout(True)
+
+    # Invert y axis so that leading team is on top
+    ax1.invert_yaxis()
+
+    ax1.plot(data['positions'], linewidth=2)
+    ind = np.arange(len(data['round_names']))
+    ax1.set_xticks(ind)
+    ax1.set_xticklabels(data['round_names'], rotation=dynamic_rotation(data['round_count']), ha="right")
+    ax1.tick_params(axis='both', which='both', labelbottom=True, labeltop=False, labelleft=True, labelright=True)
+    ax1.set_xlabel(data['labels']['x'])
+    ax1.set_ylabel(data['labels']['y'])
+    ax1.legend(data['team_names'], loc='best')
+    ax1.grid(True)
+
+    return print_png(fig)
+
+
+renderers = {
+    'team_result': team_result,
+    'rnd_result': rnd_result,
+    'team_overview': team_overview,
+    'rnd_overview': rnd_overview,
+    'ranking_overview': ranking_overview,
+}
+
+
+def render(kind, data, size):
+    """
+    Render a chart of the given kind to PNG bytes, in the given (width, height in inches, dots per inch).
+    """
+    return renderers[kind](data, size)
@@ -0,0 +1,151 @@
+"""
+Statistics of the scores of all rounds, computed at once from the score matrix.
+
+Scores of teams that did not answer a round are replaced by NaN, so that every statistic is a single
+NumPy operation over all rounds. Statistics are kept with the score matrix they were computed from,
+which is replaced on every change, and are thus computed once per data version.
+"""
+import threading
+
+import numpy as np
+
+from .scores import TENTHS, from_tenths, get_score_matrix
+
+# Number of equal parts of the maximum score in which the distribution of scores is counted
+DISTRIBUTION_BINS = 10
+
+
+def _value(value):
+    return None if np.isnan(value) else float(value)
+
+
+def _quartiles(ordered, counts):
+    """
+    Quartiles of every column of values sorted in ascending order, of which only the first counts are used.
+    They are interpolated linearly, exactly as numpy.percentile does.
+    """
+    position = np.multiply.outer([0.25, 0.5, 0.75], counts - 1)
+    low = np.floor(position).astype(int)
+    high = np.minimum(low + 1, counts - 1)
+    fraction = position - low
+    lower = np.take_along_axis(ordered, low, axis=0)
+    upper = np.take_along_axis(ordered, high, axis=0)
+    difference = upper - lower
+    return np.where(fraction >= 0.5, upper - difference * (1 - fraction), lower + difference * fraction)
+
+
+class RoundStatistics:
+    """
+    Statistics per round of the answered scores, in points, and of the scores normalized to the maximum score.
+    Boxplots use the normalized scores, with whiskers at the furthest scores within 1.5 IQR of the box
+    and the scores beyond them as fliers, like matplotlib draws them.
+    """
+    def __init__(self, matrix):
+        self.matrix = matrix
+        self.counts = matrix.round_answer_counts()
+        self.totals = matrix.round_totals()
+
+        # Rounds without answers keep NaN statistics
+        none = np.full(len(self.counts), np.nan)
+        self.mean = self.std = self.q1 = self.median = self.q3 = none
+        self.normalized = {key: none for key in ('q1', 'med', 'q3', 'mean', 'whislo', 'whishi')}
+        self.fliers = [[] for _ in self.counts]
+        self.distributions = np.zeros((len(self.counts), DISTRIBUTION_BINS), dtype=int)
+        if self.counts.any():
+            self._compute(self.counts > 0)
+
+    def _compute(self, answered):
+        """
+        Compute the statistics of the answered rounds, which are not computed for the others to avoid warnings.
+        """
+        matrix = self.matrix
+        counts = self.counts[answered]
+        # Every round sorted once, with the teams that did not answer it last
+        order = np.argsort(np.where(matrix.answered, matrix.scores, np.iinfo(np.int64).max)[:, answered], axis=0)
+        present = np.take_along_axis(matrix.answered[:, answered], order, axis=0)
+        tenths = np.take_along_axis(matrix.scores[:, answered], order, axis=0)
+        scores = np.where(present, tenths / TENTHS, np.nan)
+        normalized = np.where(present, tenths / matrix.max_scores[answered].astype(float), np.nan)
+
+        def per_round(values):
+            result = np.full(len(self.counts), np.nan)
+            result[answered] = values
+            return result
+
+        self.mean = per_round(np.nansum(scores, axis=0) / counts)
+        self.std = per_round(np.sqrt(np.nansum((scores - self.mean[answered]) ** 2, axis=0) / counts))
+        self.q1, self.median, self.q3 = (per_round(values) for values in _quartiles(scores, counts))
+
+        # Boxplots of the normalized scores
+        q1, med, q3 = _quartiles(normalized, counts)
+        iqr = q3 - q1
+        whishi = np.fmax(np.max(np.where(normalized <= q3 + 1.5 * iqr, normalized, -np.inf), axis=0), q3)
+        whislo = np.fmin(np.min(np.where(normalized >= q1 - 1.5 * iqr, normalized, np.inf), axis=0), q1)
+        self.normalized = {
+            'q1': per_round(q1), 'med': per_round(med), 'q3': per_round(q3), 'mean': per_round(np.nansum(normalized, axis=0) / counts),
+            'whislo': per_round(whislo), 'whishi': per_round(whishi),
+        }
+        # Fliers are listed in team order, like the scores they were drawn from
+        fliers = np.where((normalized < whislo) | (normalized > whishi), normalized, np.nan)
+        fliers = np.take_along_axis(fliers, np.argsort(order, axis=0), axis=0)
+        for col, values in zip(np.flatnonzero(answered), fliers.T):
+            self.fliers[col] = values[~np.isnan(values)].tolist()
+
+        # Number of scores in each equal part of the maximum score, the maximum score counting in the last part
+        rounds = normalized.shape[1]
+        bins = np.clip((np.nan_to_num(normalized) * DISTRIBUTION_BINS).astype(int), 0, DISTRIBUTION_BINS - 1)
+        bins += np.arange(rounds) * DISTRIBUTION_BINS
+        self.distributions[answered] = np.bincount(bins[present], minlength=rounds * DISTRIBUTION_BINS).reshape(rounds, DISTRIBUTION_BINS)
+
+    def box(self, col):
+        """
+        Boxplot statistics of the normalized scores of a round, as taken by matplotlib's Axes.bxp, or None without answers.
+        """
+        if not self.counts[col]:
+            return None
+        box = {key: float(values[col]) for key, values in self.normalized.items()}
+        box['fliers'] = self.fliers[col]
+        return box
+
+    def round(self, col):
+        """
+        All statistics of a round, with None for those of a round without answers.
+        """
+        rnd = self.matrix.rounds[col]
+        return {
+            'id': rnd.id,
+            'name': rnd.round_name,
+            'max_score': float(rnd.max_score),
+            'count': int(self.counts[col]),
+            'total': float(from_tenths(self.totals[col])),
+            'mean': _value(self.mean[col]),
+            'median': _value(self.median[col]),
+            'q1': _value(self.q1[col]),
+            'q3': _value(self.q3[col]),
+            'std': _value(self.std[col]),
+            'box': self.box(col),
+            'distribution': self.distributions[col].tolist(),
+        }
+
+    def rounds(self):
+        return [self.round(col) for col in range(len(self.counts))]
+
+
+_lock = threading.Lock()
+_statistics = None
+
+
+def get_round_statistics(matrix=None):
+    """
+    Return the statistics of the given or the current score matrix, computed once per matrix.
+    """
+    global _statistics
+    if matrix is None:
+        matrix = get_score_matrix()
+    statistics = _statistics
+    if statistics is None or statistics.matrix is not matrix:
+        with _lock:
+            if _statistics is None or _statistics.matrix is not matrix:
+                _statistics = RoundStatistics(matrix)
+            statistics = _statistics
+    return statistics
@@ -0,0 +1,302 @@
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from decimal import Decimal
+from typing import NamedTuple
+
+import numpy as np
+from django.db import transaction
+
+from .models import Answer, Round, Team
+from .versioning import bump_data_version, get_data_version
+
+# Scores have a single decimal. They are kept in tenths so that sums and ties stay exact.
+TENTHS = 10
+
+
+def to_tenths(value):
+    return int((Decimal(str(value)) * TENTHS).to_integral_value())
+
+
+def from_tenths(value):
+    # Like scores read from the database, with a single decimal
+    return Decimal(int(value)).scaleb(-1)
+
+
+class TeamEntry(NamedTuple):
+    id: int
+    team_name: str
+
+
+class RoundEntry(NamedTuple):
+    id: int
+    round_name: str
+    max_score: Decimal
+
+
+class ScoreMatrix:
+    """
+    Dense team x round matrix of scores, with a mask of answers that have been entered.
+    Teams and rounds are kept in primary key order, like the default ordering of their querysets.
+
+    A matrix is never modified once built: every change results in a new matrix with a higher version.
+    Views can therefore keep working on the matrix they retrieved, while it is replaced for later requests.
+    """
+    def __init__(self, teams, rounds, scores, answered, version=0):
+        self.teams = teams
+        self.rounds = rounds
+        self.team_index = {team.id: i for i, team in enumerate(teams)}
+        self.round_index = {rnd.id: i for i, rnd in enumerate(rounds)}
+        self.max_scores = np.array([to_tenths(rnd.max_score) for rnd in rounds], dtype=np.int64)
+        self.scores = scores
+        self.answered = answered
+        self.version = version
+
+    @classmethod
+    def build(cls, version=0):
+        """
+        Load all teams, rounds and answers from the database.
+        """
+        teams = [TeamEntry(*values) for values in Team.objects.order_by('pk').values_list('id', 'team_name')]
+        rounds = [RoundEntry(*values) for values in Round.objects.order_by('pk').values_list('id', 'round_name', 'max_score')]
+        matrix = cls(teams, rounds,
+                     np.zeros((len(teams), len(rounds)), dtype=np.int64),
+                     np.zeros((len(teams), len(rounds)), dtype=bool),
+                     version)
+
+        rows, cols, scores = [], [], []
+        for team_id, rnd_id, score in Answer.objects.values_list('team_id', 'rnd_id', 'score'):
+            rows.append(matrix.team_index[team_id])
+            cols.append(matrix.round_index[rnd_id])
+            scores.append(to_tenths(score))
+        matrix.scores[rows, cols] = scores
+        matrix.answered[rows, cols] = True
+
+        return matrix
+
+    # Changes, each returning a new matrix. None is returned when the change does not fit the matrix.
+    def with_answer(self, team_id, rnd_id, score):
+        return self.with_answers([(team_id, rnd_id, score)])
+
+    def with_answers(self, answers):
+        """
+        Set the scores of (team id, round id, score) tuples.
+        """
+        scores, answered = self.scores.copy(), self.answered.copy()
+        for team_id, rnd_id, score in answers:
+            if team_id not in self.team_index or rnd_id not in self.round_index:
+                return None
+            scores[self.team_index[team_id], self.round_index[rnd_id]] = to_tenths(score)
+            answered[self.team_index[team_id], self.round_index[rnd_id]] = True
+        return ScoreMatrix(self.teams, self.rounds, scores, answered)
+
+    def without_answer(self, team_id, rnd_id):
+        if team_id not in self.team_index or rnd_id not in self.round_index:
+            # The team or round itself might be gone already
+            return self
+        scores, answered = self.scores.copy(), self.answered.copy()
+        scores[self.team_index[team_id], self.round_index[rnd_id]] = 0
+        answered[self.team_index[team_id], self.round_index[rnd_id]] = False
+        return ScoreMatrix(self.teams, self.rounds, scores, answered)
+
+    def with_team(self, team_id, team_name):
+        teams = list(self.teams)
+        if team_id in self.team_index:
+            teams[self.team_index[team_id]] = TeamEntry(team_id, team_name)
+            return ScoreMatrix(teams, self.rounds, self.scores, self.answered)
+        if teams and team_id < teams[-1].id:
+            # Only new teams can be appended while keeping primary key order
+            return None
+        teams.append(TeamEntry(team_id, team_name))
+        return ScoreMatrix(teams, self.rounds,
+                           np.vstack([self.scores, np.zeros((1, len(self.rounds)), dtype=np.int64)]),
+                           np.vstack([self.answered, np.zeros((1, len(self.rounds)), dtype=bool)]))
+
+    def without_team(self, team_id):
+        if team_id not in self.team_index:
+            return self
+        row = self.team_index[team_id]
+        teams = self.teams[:row] + self.teams[row + 1:]
+        return ScoreMatrix(teams, self.rounds,
+                           np.delete(self.scores, row, axis=0),
+                           np.delete(self.answered, row, axis=0))
+
+    def with_round(self, rnd_id, round_name, max_score):
+        rounds = list(self.rounds)
+        if rnd_id in self.round_index:
+            rounds[self.round_index[rnd_id]] = RoundEntry(rnd_id, round_name, Decimal(str(max_score)))
+            return ScoreMatrix(self.teams, rounds, self.scores, self.answered)
+        if rounds and rnd_id < rounds[-1].id:
+            return None
+        rounds.append(RoundEntry(rnd_id, round_name, Decimal(str(max_score))))
+        return ScoreMatrix(self.teams, rounds,
+                           np.hstack([self.scores, np.zeros((len(self.teams), 1), dtype=np.int64)]),
+                           np.hstack([self.answered, np.zeros((len(self.teams), 1), dtype=bool)]))
+
+    def without_round(self, rnd_id):
+        if rnd_id not in self.round_index:
+            return self
+        col = self.round_index[rnd_id]
+        rounds = self.rounds[:col] + self.rounds[col + 1:]
+        return ScoreMatrix(self.teams, rounds,
+                           np.delete(self.scores, col, axis=1),
+                           np.delete(self.answered, col, axis=1))
+
+    # Aggregations, in tenths
+    def team_subtotals(self):
+        return self.scores.sum(axis=1)
+
+    def team_maxtotals(self):
+        # Maximum total for the rounds a team has an answer for
+        return (self.answered * self.max_scores).sum(axis=1)
+
+    def round_totals(self):
+        return self.scores.sum(axis=0)
+
+    def round_answer_counts(self):
+        return self.answered.sum(axis=0)
+
+    def team_scores(self, row):
+        """
+        Column indices and scores of the rounds answered by a team.
+        """
+        cols = np.flatnonzero(self.answered[row])
+        return cols, self.scores[row, cols]
+
+    def round_scores(self, col):
+        """
+        Row indices and scores of the teams that answered a round.
+        """
+        rows = np.flatnonzero(self.answered[:, col])
+        return rows, self.scores[rows, col]
+
+
+# The process wide matrix is built on first use and replaced on every change signalled by the models,
+# once the transaction making the change commits. It is tagged with the data version it reflects,
+# so changes made by other processes are detected too.
+_lock = threading.Lock()
+_matrix = None
+# Set while changes within the current transaction are applied as if they were committed, see as_committed
+_as_committed = ContextVar('kwis_as_committed', default=False)
+
+
+def get_score_matrix():
+    """
+    Return the current score matrix, building it when needed.
+    Within a transaction the matrix is built without keeping it, as it might hold changes that never get committed.
+    """
+    global _matrix
+    version = get_data_version()
+    if transaction.get_connection().in_atomic_block and not _as_committed.get():
+        return ScoreMatrix.build(version)
+    matrix = _matrix
+    if matrix is None or matrix.version != version:
+        with _lock:
+            if _matrix is None or _matrix.version != version:
+                _matrix = ScoreMatrix.build(version)
+            matrix = _matrix
+    return matrix
+
+
+def _update(change):
+    """
+    Apply a change to the matrix and bump the data version once the current transaction commits, or right away
+    outside transactions. Nothing changes when the transaction is rolled back, and other processes only see
+    the new version once they can read the data it stands for.
+    """
+    if _as_committed.get():
+        _apply(change)
+    else:
+        transaction.on_commit(lambda: _apply(change))
+
+
+def _apply(change):
+    global _matrix
+    with _lock:
+        version = bump_data_version()
+        if _matrix is not None and _matrix.version == version - 1:
+            matrix = change(_matrix)
+            if matrix is not None:
+                matrix.version = version
+            # A change that does not fit drops the matrix, to be rebuilt on next use
+            _matrix = matrix
+        else:
+            # Other processes changed the data since the matrix was built, so the change cannot be applied to it
+            _matrix = None
+
+
+@contextmanager
+def as_committed():
+    """
+    Apply changes and keep the matrix within the current transaction as if it was committed, for tools that
+    roll back all their changes at the end, like bench_views. The matrix is dropped when leaving the block.
+    """
+    token = _as_committed.set(True)
+    try:
+        yield
+    finally:
+        _as_committed.reset(token)
+        _apply(lambda matrix: None)
+
+
+def invalidate_score_matrix():
+    """
+    Drop the score matrix, e.g. after changes that bypass model signals like bulk updates.
+    """
+    _update(lambda matrix: None)
+
+
+# Changes take the values of the saved or deleted objects right away, as these might change before the commit
+
+def quiz_changed(quiz):
+    # Scores are not affected, but the data version is
+    _update(lambda matrix: matrix)
+
+
+def answer_loaded(answer):
+    """
+    Remember the team and round of an answer in the database before it is saved, from what
+    aggregates.answer_loaded read, so that an answer moved to another team or round leaves its old cell.
+    """
+    stored = getattr(answer, '_stored', None)
+    answer._stored_cell = stored[:2] if stored is not None else None
+
+
+def answer_saved(answer):
+    team_id, rnd_id, score = answer.team_id, answer.rnd_id, answer.score
+    moved_from = getattr(answer, '_stored_cell', None)
+    answer._stored_cell = (team_id, rnd_id)
+    if moved_from is None or moved_from == (team_id, rnd_id):
+        answers_saved([answer])
+    else:
+        _update(lambda matrix: matrix.without_answer(*moved_from).with_answer(team_id, rnd_id, score))
+
+
+def answers_saved(answers):
+    values = [(answer.team_id, answer.rnd_id, answer.score) for answer in answers]
+    _update(lambda matrix: matrix.with_answers(values))
+
+
+def answer_deleted(answer):
+    team_id, rnd_id = answer.team_id, answer.rnd_id
+    _update(lambda matrix: matrix.without_answer(team_id, rnd_id))
+
+
+def team_saved(team):
+    team_id, team_name = team.id, team.team_name
+    _update(lambda matrix: matrix.with_team(team_id, team_name))
+
+
+def team_deleted(team):
+    team_id = team.id
+    _update(lambda matrix: matrix.without_team(team_id))
+
+
+def round_saved(rnd):
+    rnd_id, round_name, max_score = rnd.id, rnd.round_name, rnd.max_score
+    _update(lambda matrix: matrix.with_round(rnd_id, round_name, max_score))
+
+
+def round_deleted(rnd):
+    rnd_id = rnd.id
+    _update(lambda matrix: matrix.without_round(rnd_id))
@@ -0,0 +1,94 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import Signal, receiver
+
+from . import aggregates, scores
+from .models import Answer, Quiz, Round, Team
+from .prerender import schedule_prerender
+from .websocket_utils import schedule_refresh
+
+# Keep the aggregates stored on teams and rounds, the in-memory score matrix and the data version
+# in line with every change to the quiz data.
+# Changes to teams, rounds and answers also refresh connected clients and pre-render the charts
+# once they are committed.
+
+# Sent with the list of answers written in bulk (e.g. by bulk_create), which bypasses post_save
+answers_bulk_saved = Signal()
+
+# Sent after quiz data was imported in bulk, which can change anything
+quiz_imported = Signal()
+
+
+def data_committed():
+    schedule_refresh()
+    schedule_prerender()
+
+
+@receiver(post_save, sender=Quiz)
+@receiver(post_delete, sender=Quiz)
+def quiz_changed(sender, instance, **kwargs):
+    scores.quiz_changed(instance)
+
+
+@receiver(pre_save, sender=Answer)
+def answer_saving(sender, instance, **kwargs):
+    aggregates.answer_loaded(instance)
+    scores.answer_loaded(instance)
+
+
+@receiver(post_save, sender=Answer)
+def answer_saved(sender, instance, **kwargs):
+    aggregates.answer_saved(instance)
+    scores.answer_saved(instance)
+    transaction.on_commit(data_committed)
+
+
+@receiver(answers_bulk_saved)
+def answers_bulk_saved_handler(sender, answers, **kwargs):
+    aggregates.rebuild({answer.team_id for answer in answers}, {answer.rnd_id for answer in answers})
+    scores.answers_saved(answers)
+    transaction.on_commit(data_committed)
+
+
+@receiver(quiz_imported)
+def quiz_imported_handler(sender, **kwargs):
+    aggregates.rebuild()
+    scores.invalidate_score_matrix()
+    transaction.on_commit(data_committed)
+
+
+@receiver(post_delete, sender=Answer)
+def answer_deleted(sender, instance, **kwargs):
+    aggregates.answer_deleted(instance)
+    scores.answer_deleted(instance)
+    transaction.on_commit(data_committed)
+
+
+@receiver(post_save, sender=Team)
+def team_saved(sender, instance, **kwargs):
+    scores.team_saved(instance)
+    transaction.on_commit(data_committed)
+
+
+@receiver(post_delete, sender=Team)
+def team_deleted(sender, instance, **kwargs):
+    scores.team_deleted(instance)
+    transaction.on_commit(data_committed)
+
+
+@receiver(pre_save, sender=Round)
+def round_saving(sender, instance, **kwargs):
+    aggregates.round_loaded(instance)
+
+
+@receiver(post_save, sender=Round)
+def round_saved(sender, instance, **kwargs):
+    aggregates.round_saved(instance)
+    scores.round_saved(instance)
+    transaction.on_commit(data_committed)
+
+
+@receiver(post_delete, sender=Round)
+def round_deleted(sender, instance, **kwargs):
+    scores.round_deleted(instance)
+    transaction.on_commit(data_committed)
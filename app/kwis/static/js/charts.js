@@ -0,0 +1,247 @@
+// Draw the charts of the quiz as SVG in the browser, from the chart data served as JSON.
+// Used instead of the PNG images when KWIS_CLIENT_CHARTS is set: every element with the
+// "kwis-chart" class is replaced by the chart of its data-kind, with the data at its data-src.
+(function () {
+  "use strict";
+
+  const SVG_NS = "http://www.w3.org/2000/svg";
+  // Same colors as the PNG charts, see kwis/rendering.py
+  const COLORS = {good: "green", bad: "red", empty: "lightblue", grid: "#b0b0b0", median: "orange"};
+  const LINE_COLORS = ["#1f77b4", "#ff7f0e", "#2ca02c", "#d62728", "#9467bd", "#8c564b"];
+  const MARGIN = {top: 15, right: 55, bottom: 95, left: 60};
+
+  function element(parent, name, attributes, text) {
+    const node = document.createElementNS(SVG_NS, name);
+    Object.keys(attributes || {}).forEach(function (key) {
+      node.setAttribute(key, attributes[key]);
+    });
+    if (text !== undefined) {
+      node.textContent = text;
+    }
+    parent.appendChild(node);
+    return node;
+  }
+
+  function linear(domain, range) {
+    const factor = (range[1] - range[0]) / ((domain[1] - domain[0]) || 1);
+    return function (value) {
+      return range[0] + (value - domain[0]) * factor;
+    };
+  }
+
+  // About five round values between min and max
+  function ticks(min, max) {
+    const raw = (max - min || 1) / 5;
+    const power = Math.pow(10, Math.floor(Math.log10(raw)));
+    const step = power * [1, 2, 5, 10].find(function (multiple) {
+      return raw <= power * multiple;
+    });
+    const values = [];
+    for (let value = Math.ceil(min / step) * step; value <= max + step / 1000; value += step) {
+      values.push(Number(value.toFixed(6)));
+    }
+    return values;
+  }
+
+  function maximum(values) {
+    return Math.max.apply(null, [0].concat(values));
+  }
+
+  function sum(first, second) {
+    return first.map(function (value, i) {
+      return value + second[i];
+    });
+  }
+
+  // A chart of the given size, returning the SVG and the plot area within its margins
+  function chart(container, width, height, margin) {
+    const svg = element(container, "svg", {
+      viewBox: "0 0 " + width + " " + height, width: "100%", "font-family": "sans-serif", "font-size": 11,
+    });
+    const area = {left: margin.left, right: width - margin.right, top: margin.top, bottom: height - margin.bottom};
+    return {svg: svg, area: area};
+  }
+
+  function frame(plot) {
+    const area = plot.area;
+    element(plot.svg, "rect", {
+      x: area.left, y: area.top, width: area.right - area.left, height: area.bottom - area.top, fill: "none", stroke: "black",
+    });
+  }
+
+  // Categories along the horizontal axis, labels rotated when there are many, as in the PNG charts
+  function categoryAxis(plot, names, count, label) {
+    const area = plot.area;
+    const band = (area.right - area.left) / Math.max(names.length, 1);
+    const rotated = count > 5;
+    const x = function (i) {
+      return area.left + band * (i + 0.5);
+    };
+    names.forEach(function (name, i) {
+      const attributes = {x: x(i), y: area.bottom + 14, "text-anchor": rotated ? "end" : "middle"};
+      if (rotated) {
+        attributes.transform = "rotate(-30 " + x(i) + " " + (area.bottom + 14) + ")";
+      }
+      element(plot.svg, "text", attributes, name);
+      element(plot.svg, "line", {x1: x(i), x2: x(i), y1: area.top, y2: area.bottom, stroke: COLORS.grid, "stroke-width": 0.5});
+    });
+    element(plot.svg, "text", {x: (area.left + area.right) / 2, y: area.bottom + MARGIN.bottom - 10, "text-anchor": "middle"}, label);
+    return {x: x, band: band};
+  }
+
+  // Values along a vertical axis at the left or right of the plot area
+  function valueAxis(plot, domain, options) {
+    const area = plot.area;
+    const right = options.side === "right";
+    const y = linear(domain, options.inverted ? [area.top, area.bottom] : [area.bottom, area.top]);
+    const tickX = right ? area.right + 5 : area.left - 5;
+    ticks(domain[0], domain[1]).forEach(function (value) {
+      if (options.grid) {
+        element(plot.svg, "line", {x1: area.left, x2: area.right, y1: y(value), y2: y(value), stroke: COLORS.grid, "stroke-width": 0.5});
+      }
+      element(plot.svg, "text", {
+        x: tickX, y: y(value) + 4, "text-anchor": right ? "start" : "end", fill: options.color || "black",
+      }, value);
+    });
+    if (options.label) {
+      const labelX = right ? area.right + MARGIN.right - 10 : area.left - MARGIN.left + 15;
+      const labelY = (area.top + area.bottom) / 2;
+      element(plot.svg, "text", {
+        x: labelX, y: labelY, "text-anchor": "middle", transform: "rotate(-90 " + labelX + " " + labelY + ")",
+      }, options.label);
+    }
+    return y;
+  }
+
+  // Vertical bars of the given relative width, stacked on the given bottoms
+  function bars(plot, axis, y, width, values, bottoms, color) {
+    values.forEach(function (value, i) {
+      const bottom = bottoms ? bottoms[i] : 0;
+      const top = Math.min(y(bottom), y(bottom + value));
+      element(plot.svg, "rect", {
+        x: axis.x(i) - axis.band * width / 2, y: top, width: axis.band * width,
+        height: Math.abs(y(bottom) - y(bottom + value)), fill: color,
+      });
+    });
+  }
+
+  function stackedBars(container, data, first, second, width, count) {
+    const plot = chart(container, 640, 480, MARGIN);
+    const y = valueAxis(plot, [0, maximum(sum(first, second)) || 1], {grid: true, label: data.labels.y, color: COLORS.good});
+    const axis = categoryAxis(plot, data.names, count, data.labels.x);
+    bars(plot, axis, y, width, first, null, COLORS.good);
+    bars(plot, axis, y, width, second, first, COLORS.bad);
+    frame(plot);
+  }
+
+  function teamResult(container, data) {
+    stackedBars(container, data, data.scores, data.maxima, 0.25, data.round_count);
+  }
+
+  function teamOverview(container, data) {
+    stackedBars(container, data, data.subtotals, data.maxtotals, 0.5, data.names.length);
+  }
+
+  function rndResult(container, data) {
+    const margin = Object.assign({}, MARGIN, {left: 150, right: 20, bottom: 45});
+    const plot = chart(container, 640, 480, margin);
+    const area = plot.area;
+    const band = (area.bottom - area.top) / Math.max(data.names.length, 1);
+    // The first team is at the bottom, as in the PNG chart
+    const y = function (i) {
+      return area.bottom - band * (i + 0.5);
+    };
+    const x = linear([0, maximum(data.scores) || 1], [area.left, area.right]);
+    ticks(0, maximum(data.scores) || 1).forEach(function (value) {
+      element(plot.svg, "line", {x1: x(value), x2: x(value), y1: area.top, y2: area.bottom, stroke: COLORS.grid, "stroke-width": 0.5});
+      element(plot.svg, "text", {x: x(value), y: area.bottom + 14, "text-anchor": "middle"}, value);
+    });
+    data.names.forEach(function (name, i) {
+      element(plot.svg, "text", {x: area.left - 5, y: y(i) + 4, "text-anchor": "end"}, name);
+      element(plot.svg, "rect", {x: x(0), y: y(i) - band * 0.125, width: x(data.scores[i]) - x(0), height: band * 0.25, fill: COLORS.good});
+    });
+    element(plot.svg, "text", {x: (area.left + area.right) / 2, y: area.bottom + 35, "text-anchor": "middle"}, data.labels.x);
+    const labelY = (area.top + area.bottom) / 2;
+    element(plot.svg, "text", {x: 15, y: labelY, "text-anchor": "middle", transform: "rotate(-90 15 " + labelY + ")"}, data.labels.y);
+    frame(plot);
+  }
+
+  function boxplot(plot, axis, y, box, i) {
+    const x = axis.x(i);
+    const half = axis.band / 8;
+    const line = function (x1, y1, x2, y2, color) {
+      element(plot.svg, "line", {x1: x1, y1: y(y1), x2: x2, y2: y(y2), stroke: color || "black"});
+    };
+    element(plot.svg, "rect", {x: x - half, y: y(box.q3), width: 2 * half, height: y(box.q1) - y(box.q3), fill: "none", stroke: "black"});
+    line(x - half, box.med, x + half, box.med, COLORS.median);
+    line(x, box.q1, x, box.whislo);
+    line(x, box.q3, x, box.whishi);
+    line(x - half / 2, box.whislo, x + half / 2, box.whislo);
+    line(x - half / 2, box.whishi, x + half / 2, box.whishi);
+    element(plot.svg, "path", {d: "M" + x + " " + (y(box.mean) - 4) + "l4 7h-8z", fill: COLORS.good});
+    box.fliers.forEach(function (value) {
+      element(plot.svg, "circle", {cx: x, cy: y(value), r: 3, fill: "none", stroke: "black"});
+    });
+  }
+
+  function rndOverview(container, data) {
+    const plot = chart(container, 640, 480, MARGIN);
+    const y = valueAxis(plot, [0, maximum(sum(data.maxima, data.remaining)) || 1], {grid: true, label: data.labels.y, color: COLORS.good});
+    const statistics = valueAxis(plot, [0, 1], {side: "right", label: data.labels.y2, color: COLORS.bad});
+    const axis = categoryAxis(plot, data.names, data.names.length, data.labels.x);
+    bars(plot, axis, y, 0.5, data.scores, null, COLORS.good);
+    bars(plot, axis, y, 0.5, data.difference, data.scores, COLORS.bad);
+    bars(plot, axis, y, 0.5, data.remaining, data.maxima, COLORS.empty);
+    data.boxes.forEach(function (box, i) {
+      if (box) {
+        boxplot(plot, axis, statistics, box, i);
+      }
+    });
+    frame(plot);
+  }
+
+  function rankingOverview(container, data) {
+    const margin = Object.assign({}, MARGIN, {right: 40});
+    const plot = chart(container, 640, 640, margin);
+    const positions = [].concat.apply([], data.positions);
+    const domain = [1, Math.max(maximum(positions), 2)];
+    const y = valueAxis(plot, domain, {grid: true, inverted: true, label: data.labels.y});
+    valueAxis(plot, domain, {side: "right", inverted: true});
+    const axis = categoryAxis(plot, data.round_names, data.round_count, data.labels.x);
+    data.team_names.forEach(function (name, team) {
+      const color = LINE_COLORS[team % LINE_COLORS.length];
+      const points = data.positions.map(function (row, i) {
+        return axis.x(i) + "," + y(row[team]);
+      });
+      element(plot.svg, "polyline", {points: points.join(" "), fill: "none", stroke: color, "stroke-width": 2});
+      const legendY = plot.area.top + 15 + 16 * team;
+      element(plot.svg, "line", {x1: plot.area.right - 150, x2: plot.area.right - 125, y1: legendY, y2: legendY, stroke: color, "stroke-width": 2});
+      element(plot.svg, "text", {x: plot.area.right - 120, y: legendY + 4}, name);
+    });
+    frame(plot);
+  }
+
+  const renderers = {
+    team_result: teamResult,
+    rnd_result: rndResult,
+    team_overview: teamOverview,
+    rnd_overview: rndOverview,
+    ranking_overview: rankingOverview,
+  };
+
+  function draw(container) {
+    fetch(container.dataset.src).then(function (response) {
+      if (!response.ok) {
+        throw new Error(response.status + " " + response.statusText);
+      }
+      return response.json();
+    }).then(function (data) {
+      container.textContent = "";
+      renderers[container.dataset.kind](container, data);
+    }).catch(function (error) {
+      console.error("Chart " + container.dataset.src + " could not be drawn: " + error);
+    });
+  }
+
+  document.querySelectorAll(".kwis-chart").forEach(draw);
+})();
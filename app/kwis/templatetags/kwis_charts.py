@@ -0,0 +1,44 @@
+from django import template
+from django.conf import settings
+from django.urls import reverse
+
+from kwis.charts import chart_size
+from kwis.prerender import chart_url as prerendered_chart_url
+from kwis.versioning import data_etag
+
+register = template.Library()
+
+
+@register.simple_tag
+def chart_url(kind, *args):
+    """
+    URL of a chart, pre-rendered when available: {% chart_url 'team_result' team.id %}
+    """
+    return prerendered_chart_url(kind, *args)
+
+
+@register.inclusion_tag('chart.html')
+def chart(kind, *args):
+    """
+    A chart, drawn in the browser with KWIS_CLIENT_CHARTS or else shown as image: {% chart 'team_result' team.id %}
+    """
+    if getattr(settings, 'KWIS_CLIENT_CHARTS', False):
+        # The data URL changes with the data, so browsers may cache it for good
+        return {'kind': kind, 'data_url': '%s?v=%s' % (reverse('%s_data' % kind, args=args), data_etag(None))}
+    url = prerendered_chart_url(kind, *args)
+    srcset = None
+    if not url.startswith(settings.MEDIA_URL):
+        srcset = chart_srcset(kind, url)
+    return {'kind': kind, 'url': url, 'srcset': srcset}
+
+
+def chart_srcset(kind, url):
+    """
+    Candidates of a chart in every size of KWIS_CHART_SIZES, so browsers pick the one fitting the screen.
+    Pre-rendered charts only exist in the default size.
+    """
+    candidates = [(chart_size(kind), url)]
+    candidates += [(chart_size(kind, name), '%s?size=%s' % (url, name)) for name in getattr(settings, 'KWIS_CHART_SIZES', {})]
+    if len(candidates) == 1:
+        return None
+    return ', '.join('%s %dw' % (src, round(width * dpi)) for (width, height, dpi), src in sorted(candidates))
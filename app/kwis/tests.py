@@ -1,5 +1,53 @@
-from django.test import TestCase
-from kwis.models import Team, Round, Answer
+import io
+import json
+import os
+import shutil
+import struct
+import subprocess
+import sys
+import tempfile
+import time
+import warnings
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+from unittest import mock
+
+import numpy as np
+from asgiref.sync import sync_to_async
+from channels.testing import WebsocketCommunicator
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import IntegrityError, connection, transaction
+from django.test import Client, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from kwis import aggregates, prerender, views
+from kwis.cache import BoundedLocMemCache, FileBasedCache
+from kwis.charts import ChartCache, chart_cache, render_chart, shutdown_executor
+from kwis.consumers import RefreshConsumer
+from kwis.metrics import refresh_metrics
+from kwis.models import Quiz, Team, Round, Answer
+from kwis.prerender import prerender_charts
+from kwis.ranking import get_ranking_update, get_ranked_results, get_ranking_history, get_round_progress
+from kwis.round_statistics import get_round_statistics
+from kwis.scores import ScoreMatrix, get_score_matrix, invalidate_score_matrix
+from kwis.versioning import bump_data_version, data_etag, get_data_version
+from kwis.timing import Histogram, timing_stats
+from kwis.transfer import TransferError, aexport_lines, export_lines, import_records, read_records
+from kwis.websocket_utils import RefreshScheduler, schedule_refresh, trigger_refresh
+
+# Refreshes scheduled on commit run from timers, which would fire in later tests
+auto_refresh_disabled = override_settings(KWIS_AUTO_REFRESH=False)
+
+
+def setUpModule():
+    auto_refresh_disabled.enable()
+
+
+def tearDownModule():
+    auto_refresh_disabled.disable()
 
 
 # Create your tests here.
@@ -30,3 +78,978 @@ class KwisModelsTestCase(TestCase):
         with self.assertRaises(Exception):
             # Attempting to create a second answer for the same team and round should raise an error
             Answer.objects.create(team=self.team1, rnd=self.round1, score=95)
+
+
+class CommittedTestCase(TransactionTestCase):
+    """
+    Tests of which the changes are committed, for the score matrix that is only kept on committed data.
+    """
+    def tearDown(self):
+        # The database is emptied afterwards without sending model signals
+        invalidate_score_matrix()
+
+
+class RankingTestCase(CommittedTestCase):
+    def setUp(self):
+        self.teams = [Team.objects.create(team_name="Team %s" % c) for c in "ABCD"]
+        self.round1 = Round.objects.create(round_name="Round 1", max_score=10)
+        self.round2 = Round.objects.create(round_name="Round 2", max_score=10)
+        for team, score in zip(self.teams, [8, 9, 8, 5]):
+            Answer.objects.create(team=team, rnd=self.round1, score=score)
+        # Round 2 is not complete
+        Answer.objects.create(team=self.teams[3], rnd=self.round2, score=10)
+
+    def test_ranked_results_ex_aequo(self):
+        ranking = get_ranked_results([self.round1])
+        self.assertEqual(ranking, [(1, "Team B", 9), (2, "Team A", 8), (2, "Team C", 8), (4, "Team D", 5)])
+
+    def test_ranked_results_without_completed_rounds(self):
+        ranking = get_ranked_results([])
+        self.assertEqual([r[0] for r in ranking], [1, 1, 1, 1])
+        self.assertEqual([r[2] for r in ranking], [0, 0, 0, 0])
+
+    def test_ranked_results_query_count(self):
+        # Teams, rounds and answers are loaded once
+        with self.assertNumQueries(3):
+            get_ranked_results([self.round1, self.round2])
+        with self.assertNumQueries(0):
+            get_ranked_results([self.round1, self.round2])
+
+        # Query count stays constant when the quiz grows
+        rounds = [Round.objects.create(round_name="Extra %d" % i, max_score=10) for i in range(5)]
+        for i in range(20):
+            team = Team.objects.create(team_name="Extra %d" % i)
+            for rnd in rounds:
+                Answer.objects.create(team=team, rnd=rnd, score=i % 10)
+        with self.assertNumQueries(0):
+            get_ranked_results(rounds)
+        invalidate_score_matrix()
+        with self.assertNumQueries(3):
+            get_ranked_results(rounds)
+
+    def test_round_progress(self):
+        progress = get_round_progress()
+        self.assertEqual([r.id for r in progress], [self.round1.id, self.round2.id])
+        self.assertEqual([r.answer_count for r in progress], [4, 1])
+        self.assertEqual([r.team_count for r in progress], [4, 4])
+        self.assertEqual([r.id for r in progress.completed], [self.round1.id])
+        self.assertFalse(progress.all_complete)
+
+    def test_ranking_history(self):
+        for team, score in zip(self.teams[:3], [1.5, 0, 1]):
+            Answer.objects.create(team=team, rnd=self.round2, score=score)
+        rounds = [self.round1, self.round2]
+
+        history = get_ranking_history(rounds)
+
+        # Every prefix of the history ranks like the ranking page does
+        for i in range(len(rounds)):
+            ranking = get_ranked_results(rounds[:i + 1])
+            ranks = {name: history.ranks[t, i] for t, name in enumerate(history.team_names)}
+            self.assertEqual([ranks[name] for rank, name, score in ranking], [rank for rank, name, score in ranking])
+
+        self.assertEqual([history.team_names[t] for t in history.top(3)], ["Team D", "Team A", "Team B"])
+
+    def test_ranking_history_without_completed_rounds(self):
+        history = get_ranking_history([])
+        self.assertEqual(len(history.top(5)), 0)
+
+    def test_ranking_view(self):
+        Quiz.objects.create(name="Test quiz")
+        response = self.client.get(reverse('ranking'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['caption'], "Ranking after Round 1")
+        self.assertEqual(response.context['sorted'][0], (1, "Team B", 9))
+
+
+class ScoreMatrixTestCase(CommittedTestCase):
+    def setUp(self):
+        self.team1 = Team.objects.create(team_name="Team A")
+        self.team2 = Team.objects.create(team_name="Team B")
+        self.round1 = Round.objects.create(round_name="Round 1", max_score=10)
+        self.round2 = Round.objects.create(round_name="Round 2", max_score=15)
+        self.answer = Answer.objects.create(team=self.team1, rnd=self.round1, score=7.5)
+        Answer.objects.create(team=self.team2, rnd=self.round2, score=12)
+        self.matrix = get_score_matrix()
+
+    def assertMatchesDatabase(self):
+        matrix = get_score_matrix()
+        built = ScoreMatrix.build()
+        self.assertEqual(matrix.teams, built.teams)
+        self.assertEqual(matrix.rounds, built.rounds)
+        self.assertTrue((matrix.scores == built.scores).all())
+        self.assertTrue((matrix.answered == built.answered).all())
+        self.assertTrue((matrix.max_scores == built.max_scores).all())
+        self.assertEqual(matrix.version, get_data_version())
+
+    def test_build(self):
+        self.assertEqual(self.matrix.scores.tolist(), [[75, 0], [0, 120]])
+        self.assertEqual(self.matrix.team_subtotals().tolist(), [75, 120])
+        self.assertEqual(self.matrix.team_maxtotals().tolist(), [100, 150])
+        self.assertEqual(self.matrix.round_answer_counts().tolist(), [1, 1])
+
+    def test_answer_changes(self):
+        self.answer.score = 9
+        self.answer.save()
+        Answer.objects.create(team=self.team2, rnd=self.round1, score=3)
+        self.assertMatchesDatabase()
+        self.answer.delete()
+        self.assertMatchesDatabase()
+        # The matrix retrieved before the changes is left untouched, but is stale
+        self.assertEqual(self.matrix.scores.tolist(), [[75, 0], [0, 120]])
+        self.assertNotEqual(self.matrix.version, get_data_version())
+
+    def test_answer_moved(self):
+        # An answer moved to another team leaves its old cell, which is no longer answered
+        self.answer.team = self.team2
+        self.answer.save()
+        self.assertEqual(get_score_matrix().scores.tolist(), [[0, 0], [75, 120]])
+        self.assertEqual(get_score_matrix().answered.tolist(), [[False, False], [True, True]])
+        self.assertMatchesDatabase()
+        self.answer.rnd = self.round2
+        self.answer.team = self.team1
+        self.answer.save()
+        self.assertMatchesDatabase()
+
+    def test_changes_of_other_processes(self):
+        # Another process saves an answer and bumps the version, without signals in this process
+        Answer.objects.bulk_create([Answer(team=self.team2, rnd=self.round1, score=4)])
+        bump_data_version()
+        # A change made here afterwards cannot be applied to the matrix, which misses the other answer
+        self.answer.score = 9
+        self.answer.save()
+        self.assertEqual(get_score_matrix().scores.tolist(), [[90, 0], [40, 120]])
+        self.assertMatchesDatabase()
+
+    def test_rolled_back_changes(self):
+        version = get_data_version()
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            self.answer.score = 9
+            self.answer.save()
+            Answer.objects.create(team=self.team1, rnd=self.round1, score=1)
+        # Neither the matrix nor the version followed the changes that were never committed
+        self.assertEqual(get_data_version(), version)
+        self.assertIs(get_score_matrix(), self.matrix)
+        self.assertMatchesDatabase()
+        self.assertEqual(get_ranked_results([self.round1])[0], (1, "Team A", Decimal("7.5")))
+
+    def test_team_changes(self):
+        self.team1.team_name = "Team Z"
+        self.team1.save()
+        team3 = Team.objects.create(team_name="Team C")
+        Answer.objects.create(team=team3, rnd=self.round2, score=1)
+        self.assertMatchesDatabase()
+        self.team2.delete()
+        self.assertMatchesDatabase()
+
+    def test_round_changes(self):
+        self.round1.max_score = 20
+        self.round1.save()
+        Round.objects.create(round_name="Round 3", max_score=5)
+        self.assertMatchesDatabase()
+        self.round2.delete()
+        self.assertMatchesDatabase()
+
+
+class ConditionalGetTestCase(TestCase):
+    def setUp(self):
+        Quiz.objects.create(name="Test quiz")
+        self.team = Team.objects.create(team_name="Team A")
+        self.round = Round.objects.create(round_name="Round 1", max_score=10)
+
+    def test_unchanged_data_not_modified(self):
+        for url in [reverse('ranking'), reverse('index'), '/kwis/rnd_overview.png']:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            with self.assertNumQueries(0):
+                response = self.client.get(url, headers={'if-none-match': response['ETag']})
+            self.assertEqual(response.status_code, 304)
+
+    def test_csrf_token_rotated(self):
+        User.objects.create_user(username="admin", password="secret", is_staff=True)
+        self.client.login(username="admin", password="secret")
+        # The first page sets the CSRF cookie
+        self.client.get(reverse('index'))
+        etag = self.client.get(reverse('index'))['ETag']
+        response = self.client.get(reverse('index'), headers={'if-none-match': etag})
+        self.assertEqual(response.status_code, 304)
+
+        # Logging in again rotates the CSRF token, so the page holding the import form is sent again
+        self.client.logout()
+        self.client.login(username="admin", password="secret")
+        response = self.client.get(reverse('index'), headers={'if-none-match': etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'csrfmiddlewaretoken')
+
+    def test_changed_data_modified(self):
+        response = self.client.get(reverse('ranking'))
+        version = get_data_version()
+        with self.captureOnCommitCallbacks(execute=True):
+            Answer.objects.create(team=self.team, rnd=self.round, score=5)
+        self.assertGreater(get_data_version(), version)
+
+        response = self.client.get(reverse('ranking'), headers={'if-none-match': response['ETag']})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['sorted'], [(1, "Team A", 5)])
+
+
+class ChartCacheTestCase(TestCase):
+    def setUp(self):
+        chart_cache.clear()
+        self.team = Team.objects.create(team_name="Team A")
+        self.round = Round.objects.create(round_name="Round 1", max_score=10)
+
+    def test_shared_between_processes(self):
+        # Caches of different processes use the same charts cache
+        first, second = ChartCache(), ChartCache()
+        first.set(('team_result', (1,), 'en'), 1, b'png')
+        self.assertEqual(second.get(('team_result', (1,), 'en'), 1), b'png')
+        self.assertIsNone(second.get(('team_result', (1,), 'nl'), 1))
+        # A newer data version is a miss
+        self.assertIsNone(second.get(('team_result', (1,), 'en'), 2))
+        self.assertEqual(second.stats(), {'hits': 1, 'misses': 2})
+
+    @override_settings(CACHES={
+        'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+        'charts': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': os.path.join(tempfile.gettempdir(), 'kwis-test-charts')},
+    })
+    def test_file_based_cache(self):
+        cache = ChartCache()
+        cache.clear()
+        cache.set(('rnd_result', (2,), 'en'), 3, b'png')
+        self.assertEqual(ChartCache().get(('rnd_result', (2,), 'en'), 3), b'png')
+        cache.clear()
+
+    def test_file_based_data_version(self):
+        # Processes sharing a directory never get the same version, as threads with a cache of their own show
+        location = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, location)
+        FileBasedCache(location, {}).add('version', 0, timeout=None)
+
+        def bump():
+            cache = FileBasedCache(location, {})
+            return [cache.incr('version') for i in range(25)]
+
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            versions = sum(executor.map(lambda i: bump(), range(4)), [])
+        self.assertEqual(sorted(versions), list(range(1, 101)))
+
+    def test_chart_rendered_once_per_data_version(self):
+        url = '/kwis/team/%d/result.png' % self.team.id
+        first = self.client.get(url)
+        second = self.client.get(url)
+        self.assertEqual(first['Content-Type'], 'image/png')
+        self.assertEqual(first.content, second.content)
+        self.assertEqual(chart_cache.stats()['hits'], 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Answer.objects.create(team=self.team, rnd=self.round, score=5)
+        third = self.client.get(url)
+        self.assertNotEqual(first.content, third.content)
+        self.assertEqual(chart_cache.stats(), {'hits': 1, 'misses': 2})
+
+    def test_unknown_object(self):
+        response = self.client.get('/kwis/round/%d/result.png' % (self.round.id + 1))
+        self.assertEqual(response.status_code, 404)
+
+    @override_settings(KWIS_CHART_SIZES={'small': (4.8, 3.6, 100), 'large': (12.8, 9.6, 150)})
+    def test_sizes(self):
+        url = '/kwis/team/%d/result.png' % self.team.id
+
+        def dimensions(response):
+            # Width and height from the IHDR chunk of the PNG
+            return struct.unpack('>II', response.content[16:24])
+
+        self.assertEqual(dimensions(self.client.get(url)), (640, 480))
+        self.assertEqual(dimensions(self.client.get(url, {'size': 'small'})), (480, 360))
+        self.assertEqual(dimensions(self.client.get(url, {'size': 'large'})), (1920, 1440))
+        self.assertEqual(dimensions(self.client.get('/kwis/ranking/overview.png', {'size': 'small'})), (480, 360))
+        # Every size is cached apart
+        self.client.get(url, {'size': 'small'})
+        self.assertEqual(chart_cache.stats(), {'hits': 1, 'misses': 4})
+        # Other sizes are refused before rendering anything
+        self.assertEqual(self.client.get(url, {'size': '4000x4000'}).status_code, 400)
+        self.assertEqual(chart_cache.stats(), {'hits': 1, 'misses': 4})
+
+        User.objects.create_user(username="jury", password="secret")
+        self.client.login(username="jury", password="secret")
+        response = self.client.get(reverse('team_detail', args=[self.team.id]))
+        self.assertContains(response, 'srcset="%s?size=small 480w, %s 640w, %s?size=large 1920w"' % (url, url, url))
+
+    def test_bounded_local_memory_cache(self):
+        cache = BoundedLocMemCache('kwis-test-bounded', {'OPTIONS': {'MAX_BYTES': 3000}})
+        cache.clear()
+        for key in 'abc':
+            cache.set(key, b'x' * 900)
+        # Reading an entry makes it the most recently used one
+        cache.get('a')
+        cache.set('d', b'x' * 900)
+        self.assertEqual([key for key in 'abcd' if cache.has_key(key)], ['a', 'c', 'd'])
+        # An entry larger than the cache is not kept
+        cache.set('e', b'x' * 4000)
+        self.assertIsNone(cache.get('e'))
+        cache.clear()
+
+
+class ChartRenderingTestCase(TestCase):
+    def test_rendered_by_worker_process(self):
+        data = {'scores': [1.0, 2.5], 'names': ["Team A", "Team B"], 'labels': {'x': "Scores", 'y': "Teams"}}
+        with self.settings(KWIS_CHART_WORKERS=1):
+            png = render_chart('rnd_result', data)
+        shutdown_executor()
+        with self.settings(KWIS_CHART_WORKERS=0):
+            self.assertEqual(render_chart('rnd_result', data), png)
+        self.assertTrue(png.startswith(b'\x89PNG'))
+
+    def test_matplotlib_loaded_lazily(self):
+        # A fresh process serving pages and websockets does not load matplotlib
+        code = "import sys, django; django.setup(); import kwis.urls, kwispel.asgi; print('matplotlib' in sys.modules)"
+        result = subprocess.run([sys.executable, '-c', code], cwd=settings.BASE_DIR, capture_output=True, text=True, check=True,
+                                env=dict(os.environ, DJANGO_SETTINGS_MODULE='kwispel.settings'))
+        self.assertEqual(result.stdout.strip(), "False")
+
+
+@override_settings(CHANNEL_LAYERS={'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}})
+class RankingUpdateTestCase(TestCase):
+    def setUp(self):
+        self.quiz = Quiz.objects.create(name="Test quiz")
+        rnd = Round.objects.create(round_name="Round 1", max_score=10)
+        for name, score in [("Team A", 4), ("Team B", 8.5), ("Team C", 6), ("Team D", 1)]:
+            Answer.objects.create(team=Team.objects.create(team_name=name), rnd=rnd, score=score)
+
+    def test_final_ranking_hides_top_three(self):
+        self.quiz.reveal_count = 1
+        self.quiz.save()
+        update = get_ranking_update()
+        self.assertEqual(set(update['captions']), {'en', 'nl'})
+        self.assertEqual(update['captions']['en'], "Final ranking")
+        self.assertEqual(update['hidden'], 2)
+        self.assertEqual(update['rows'], [[1, "???", "???"], [2, "???", "???"], [3, "Team A", "4.0"], [4, "Team D", "1.0"]])
+        self.assertEqual(update['version'], get_data_version())
+
+    async def test_broadcast_to_consumers(self):
+        communicator = WebsocketCommunicator(RefreshConsumer.as_asgi(), "/ws/refresh/")
+        connected, _ = await communicator.connect()
+        self.assertTrue(connected)
+
+        await sync_to_async(trigger_refresh)()
+        message = json.loads(await communicator.receive_from())
+        self.assertEqual(message['action'], "ranking")
+        self.assertEqual(message['rows'][0], [1, "???", "???"])
+        await communicator.disconnect()
+
+    async def test_metrics(self):
+        refresh_metrics.clear()
+        communicator = WebsocketCommunicator(RefreshConsumer.as_asgi(), "/ws/refresh/")
+        await communicator.connect()
+        self.assertEqual(refresh_metrics.connections, 1)
+        await sync_to_async(trigger_refresh)()
+        await communicator.receive_from()
+        await communicator.disconnect()
+
+        self.assertEqual((refresh_metrics.connections, refresh_metrics.connects, refresh_metrics.disconnects), (0, 1, 1))
+        self.assertEqual(refresh_metrics.broadcasts, 1)
+        self.assertEqual(refresh_metrics.deliveries.count, 1)
+
+        with override_settings(KWIS_METRICS_TOKEN="secret"):
+            self.assertEqual((await sync_to_async(self.client.get)(reverse('metrics'))).status_code, 403)
+            response = await sync_to_async(self.client.get)(reverse('metrics'), headers={'authorization': "Bearer secrets"})
+            self.assertEqual(response.status_code, 403)
+            response = await sync_to_async(self.client.get)(reverse('metrics'), headers={'authorization': "Bearer secret"})
+        self.assertContains(response, "kwis_refresh_broadcasts_total 1\n")
+        self.assertContains(response, 'kwis_refresh_delivery_seconds_bucket{le="+Inf"} 1\n')
+
+
+class RefreshBenchmarkTestCase(TestCase):
+    def test_bench_refresh(self):
+        out = io.StringIO()
+        call_command('bench_refresh', connections=[3, 10], broadcasts=2, json=True, stdout=out)
+        results = json.loads(out.getvalue())
+        self.assertEqual([result['connections'] for result in results], [3, 10])
+        self.assertGreater(results[0]['fanout_max_seconds'], 0)
+
+
+class SqliteBenchmarkTestCase(TestCase):
+    def test_bench_sqlite(self):
+        out = io.StringIO()
+        call_command('bench_sqlite', readers=2, writers=2, duration=0.2, teams=5, rounds=2, json=True, stdout=out)
+        results = json.loads(out.getvalue())
+        self.assertEqual(set(results), {'default', 'concurrent'})
+        self.assertGreater(results['concurrent']['read']['per_second'], 0)
+        self.assertEqual(results['concurrent']['write']['errors'], 0)
+
+
+class ViewBenchmarkTestCase(TestCase):
+    def test_generate_quiz(self):
+        call_command('generate_quiz', teams=10, rounds=5, completion=0.4, seed=1, stdout=io.StringIO())
+        self.assertEqual(Team.objects.count(), 10)
+        progress = get_round_progress()
+        self.assertEqual(len(progress.completed), 2)
+        self.assertTrue(0 < progress.rounds[2].answer_count < 10)
+        self.assertEqual(progress.rounds[3].answer_count, 0)
+        self.assertEqual(aggregates.verify(), [])
+
+    def test_generate_quiz_asks_before_replacing(self):
+        Team.objects.create(team_name="Existing team")
+        with mock.patch('builtins.input', return_value='no') as confirm:
+            with self.assertRaises(CommandError):
+                call_command('generate_quiz', teams=3, rounds=2, stdout=io.StringIO())
+        confirm.assert_called_once()
+        self.assertTrue(Team.objects.filter(team_name="Existing team").exists())
+
+        call_command('generate_quiz', teams=3, rounds=2, interactive=False, stdout=io.StringIO())
+        self.assertFalse(Team.objects.filter(team_name="Existing team").exists())
+        self.assertEqual(Team.objects.count(), 3)
+
+    def test_bench_views(self):
+        out = io.StringIO()
+        call_command('bench_views', teams=5, rounds=3, repeat=1, json=True, stdout=out)
+        results = json.loads(out.getvalue())
+        self.assertIn('team_overview', results['views'])
+        self.assertNotIn('delete', results['views'])
+        self.assertEqual(results['views']['index']['warm_queries'], results['views']['team_detail']['warm_queries'])
+        self.assertGreater(results['views']['rnd_result']['peak_kib'], 0)
+        # Generated data is rolled back
+        self.assertFalse(Team.objects.exists())
+
+        # A baseline that was much faster is reported
+        for result in results['views'].values():
+            result['warm_ms'] /= 100
+        with tempfile.NamedTemporaryFile('w', suffix='.json') as baseline:
+            json.dump(results, baseline)
+            baseline.flush()
+            with self.assertRaises(CommandError):
+                call_command('bench_views', teams=5, rounds=3, repeat=1, baseline=baseline.name, stdout=io.StringIO(), stderr=io.StringIO())
+
+
+class RefreshSchedulerTestCase(TestCase):
+    @override_settings(KWIS_REFRESH_DEBOUNCE=0.05, KWIS_REFRESH_MAX_DELAY=1)
+    def test_burst_coalesced(self):
+        scheduler = RefreshScheduler()
+        with mock.patch('kwis.websocket_utils.trigger_refresh') as refresh:
+            for i in range(20):
+                scheduler.schedule()
+            time.sleep(0.3)
+        self.assertEqual(refresh.call_count, 1)
+
+    @override_settings(KWIS_REFRESH_DEBOUNCE=0.1, KWIS_REFRESH_MAX_DELAY=0.2)
+    def test_max_delay(self):
+        scheduler = RefreshScheduler()
+        with mock.patch('kwis.websocket_utils.trigger_refresh') as refresh:
+            # Keep on requesting refreshes within the debounce time
+            start = time.monotonic()
+            while not refresh.called and time.monotonic() - start < 2:
+                scheduler.schedule()
+                time.sleep(0.02)
+        self.assertEqual(refresh.call_count, 1)
+        self.assertLess(time.monotonic() - start, 0.5)
+
+    def test_scheduled_on_commit(self):
+        with mock.patch('kwis.signals.schedule_refresh') as schedule:
+            with self.captureOnCommitCallbacks(execute=True):
+                Answer.objects.create(team=Team.objects.create(team_name="Team A"),
+                                      rnd=Round.objects.create(round_name="Round 1", max_score=10), score=5)
+        self.assertEqual(schedule.call_count, 3)
+
+    def test_auto_refresh_setting(self):
+        with mock.patch('kwis.websocket_utils.refresh_scheduler') as scheduler:
+            schedule_refresh()
+            self.assertFalse(scheduler.schedule.called)
+            with override_settings(KWIS_AUTO_REFRESH=True):
+                schedule_refresh()
+            self.assertEqual(scheduler.schedule.call_count, 1)
+
+
+class JuryPageQueriesTestCase(TestCase):
+    def setUp(self):
+        User.objects.create_user(username="jury", password="secret")
+        self.client.login(username="jury", password="secret")
+        Quiz.objects.create(name="Test quiz")
+
+    def add_quiz_data(self, team_count, round_count):
+        teams = [Team.objects.create(team_name="Team %d" % i) for i in range(team_count)]
+        rounds = [Round.objects.create(round_name="Round %d" % i, max_score=10) for i in range(round_count)]
+        # Leave the last team without answers, so every page lists something to do
+        for team in teams[:-1]:
+            for rnd in rounds:
+                Answer.objects.create(team=team, rnd=rnd, score=5)
+        return teams[0], rounds[0]
+
+    def count_queries(self, team, rnd):
+        counts = []
+        for url in (reverse('index'), reverse('rnd_detail', args=(rnd.id,)), reverse('team_detail', args=(team.id,))):
+            # Within the test transaction the score matrix is built on every request, as after a change by another process
+            with CaptureQueriesContext(connection) as queries:
+                self.assertEqual(self.client.get(url).status_code, 200)
+            counts.append(len(queries))
+        return counts
+
+    def test_query_count_independent_of_quiz_size(self):
+        small = self.count_queries(*self.add_quiz_data(2, 2))
+        Answer.objects.all().delete()
+        Team.objects.all().delete()
+        Round.objects.all().delete()
+        large = self.count_queries(*self.add_quiz_data(20, 12))
+        self.assertEqual(small, large)
+
+
+class RoundScoresTestCase(TestCase):
+    def setUp(self):
+        User.objects.create_user(username="jury", password="secret")
+        self.client.login(username="jury", password="secret")
+        self.round = Round.objects.create(round_name="Round 1", max_score=10)
+        self.teams = [Team.objects.create(team_name="Team %d" % i) for i in range(5)]
+        Answer.objects.create(team=self.teams[0], rnd=self.round, score=1)
+        self.url = reverse('rnd_scores', args=(self.round.id,))
+
+    def test_all_scores_saved_at_once(self):
+        data = {'team_%d' % team.id: i + 0.5 for i, team in enumerate(self.teams)}
+        data['team_%d' % self.teams[4].id] = ''  # Left blank
+        matrix = get_score_matrix()
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            response = self.client.post(self.url, data)
+        self.assertRedirects(response, reverse('rnd_detail', args=(self.round.id,)))
+        # A single update of the score matrix and a single refresh for all answers
+        self.assertEqual(len(callbacks), 2)
+
+        scores = dict(self.round.answer_set.values_list('team__team_name', 'score'))
+        self.assertEqual(scores, {"Team 0": Decimal("0.5"), "Team 1": Decimal("1.5"), "Team 2": Decimal("2.5"), "Team 3": Decimal("3.5")})
+        # The score matrix followed
+        self.assertGreater(get_score_matrix().version, matrix.version)
+        self.assertEqual(get_score_matrix().round_answer_counts().tolist(), [4])
+
+    def test_invalid_scores_not_saved(self):
+        data = {'team_%d' % self.teams[1].id: 5, 'team_%d' % self.teams[2].id: 11}
+        response = self.client.post(self.url, data)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.context['form'].errors)
+        self.assertEqual(self.round.answer_set.count(), 1)
+
+    def test_form_shows_current_scores(self):
+        response = self.client.get(self.url)
+        self.assertContains(response, 'value="1.0"')
+
+
+class ScoreBatchApiTestCase(TestCase):
+    def setUp(self):
+        User.objects.create_user(username="jury", password="secret")
+        self.client.login(username="jury", password="secret")
+        self.round = Round.objects.create(round_name="Round 1", max_score=10)
+        self.teams = [Team.objects.create(team_name="Team %d" % i) for i in range(3)]
+        self.url = reverse('api_scores')
+
+    def post(self, scores, key="batch-1", **headers):
+        return self.client.post(self.url, json.dumps({'scores': scores}), content_type='application/json',
+                                headers={'idempotency-key': key, **headers})
+
+    def test_batch_saved_once(self):
+        scores = [{'team': team.id, 'round': self.round.id, 'score': "%d.5" % i} for i, team in enumerate(self.teams)]
+        response = self.post(scores)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {'saved': 3, 'version': get_data_version()})
+        self.assertEqual(get_score_matrix().team_subtotals().tolist(), [5, 15, 25])
+
+        # A retry is not saved again, even when scores changed in the meantime
+        Answer.objects.filter(team=self.teams[0]).update(score=9)
+        retry = self.post(scores)
+        self.assertEqual(retry.json(), response.json())
+        self.assertEqual(Answer.objects.get(team=self.teams[0]).score, 9)
+
+    def test_key_used_for_another_batch(self):
+        self.assertEqual(self.post([{'team': self.teams[0].id, 'round': self.round.id, 'score': 1}]).status_code, 200)
+        response = self.post([{'team': self.teams[0].id, 'round': self.round.id, 'score': 2}])
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(Answer.objects.get().score, 1)
+
+    @override_settings(KWIS_API_TOKEN="secret")
+    def test_authentication(self):
+        client = Client(enforce_csrf_checks=True)
+        scores = json.dumps({'scores': [{'team': self.teams[0].id, 'round': self.round.id, 'score': 1}]})
+
+        def post(**headers):
+            return client.post(self.url, scores, content_type='application/json', headers={'idempotency-key': "batch-1", **headers})
+
+        self.assertEqual(post().status_code, 401)
+        self.assertEqual(post(authorization="Bearer wrong").status_code, 401)
+        # Devices use the token, without session or CSRF token
+        self.assertEqual(post(authorization="Bearer secret").status_code, 200)
+
+        # Pages of the site use the session, with the CSRF token
+        client.login(username="jury", password="secret")
+        self.assertEqual(post(**{'idempotency-key': "batch-2"}).status_code, 403)
+        client.get(reverse('rnd_scores', args=(self.round.id,)))
+        response = post(**{'idempotency-key': "batch-2", 'x-csrftoken': client.cookies['csrftoken'].value})
+        self.assertEqual(response.status_code, 200)
+
+    def test_invalid_batch(self):
+        response = self.post([
+            {'team': self.teams[0].id, 'round': self.round.id, 'score': 11},
+            {'team': self.teams[1].id, 'round': self.round.id + 1, 'score': 1},
+            {'team': self.teams[2].id, 'round': self.round.id, 'score': 1},
+        ])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(set(response.json()['errors']), {'0', '1'})
+        self.assertFalse(Answer.objects.exists())
+
+    def test_boolean_ids_refused(self):
+        # True equals 1 in Python, so it would match the team or round with id 1
+        if not Team.objects.filter(pk=1).exists():
+            Team.objects.create(pk=1, team_name="Team true")
+        if not Round.objects.filter(pk=1).exists():
+            Round.objects.create(pk=1, round_name="Round true", max_score=10)
+        response = self.post([{'team': True, 'round': self.round.id, 'score': 1},
+                              {'team': self.teams[0].id, 'round': True, 'score': 1}])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(set(response.json()['errors']), {'0', '1'})
+        self.assertFalse(Answer.objects.exists())
+
+    def test_if_match(self):
+        scores = [{'team': self.teams[0].id, 'round': self.round.id, 'score': 1}]
+        stale = self.post(scores, **{'if-match': '"%d"' % (get_data_version() - 1)})
+        self.assertEqual(stale.status_code, 412)
+        response = self.post(scores, key="batch-2", **{'if-match': '"%d"' % get_data_version()})
+        self.assertEqual(response.status_code, 200)
+
+    def test_if_match_checked_before_saving(self):
+        validate = views.validate_score_batch
+
+        def validate_while_changed(items):
+            # Another change is committed while the batch is validated
+            bump_data_version()
+            return validate(items)
+
+        scores = [{'team': self.teams[0].id, 'round': self.round.id, 'score': 1}]
+        with mock.patch('kwis.views.validate_score_batch', side_effect=validate_while_changed):
+            response = self.post(scores, **{'if-match': '"%d"' % get_data_version()})
+        self.assertEqual(response.status_code, 412)
+        self.assertFalse(Answer.objects.exists())
+
+    def test_idempotency_key_required(self):
+        response = self.post([], key="")
+        self.assertEqual(response.status_code, 400)
+
+
+class QuizTransferTestCase(TestCase):
+    def setUp(self):
+        Quiz.objects.create(name="Test quiz", reveal_count=1)
+        teams = [Team.objects.create(team_name="Team %d" % i) for i in range(3)]
+        rounds = [Round.objects.create(round_name="Round, %d" % i, max_score=10) for i in range(2)]
+        for i, team in enumerate(teams):
+            for rnd in rounds:
+                Answer.objects.create(team=team, rnd=rnd, score=Decimal(i) + Decimal("0.5"))
+
+    def snapshot(self):
+        return (list(Quiz.objects.values_list('name', 'reveal_count')),
+                sorted(Answer.objects.values_list('team__team_name', 'rnd__round_name', 'score', 'rnd__max_score')))
+
+    def test_round_trip(self):
+        expected = self.snapshot()
+        for fmt in ('csv', 'jsonl'):
+            exported = list(export_lines(fmt))
+            counts = import_records(read_records(exported, fmt), replace=True, chunk_size=2)
+            self.assertEqual(counts, {'quiz': 1, 'team': 3, 'round': 2, 'answer': 6})
+            self.assertEqual(self.snapshot(), expected)
+            self.assertEqual(Quiz.objects.count(), 1)
+        # The score matrix is rebuilt from the imported data
+        self.assertEqual(get_score_matrix().team_subtotals().tolist(), [10, 30, 50])
+
+    def test_invalid_import_rolled_back(self):
+        records = [{'kind': 'team', 'name': "Team X"},
+                   {'kind': 'answer', 'team': "Team X", 'round': "Unknown", 'value': "1"}]
+        with self.assertRaises(TransferError):
+            import_records(records)
+        self.assertFalse(Team.objects.filter(team_name="Team X").exists())
+
+    def test_values_validated_like_the_models(self):
+        expected = self.snapshot()
+        invalid = [
+            [{'kind': 'round', 'name': "Round X", 'value': "12345678"}],
+            [{'kind': 'round', 'name': "Round X", 'value': "7.25"}],
+            [{'kind': 'team', 'name': "T" * 201}],
+            [{'kind': 'quiz', 'name': "Q" * 201}],
+            [{'kind': 'answer', 'team': "Team 0", 'round': "Round, 0", 'value': "7.25"}],
+            [{'kind': 'answer', 'team': "Team 0", 'round': "Round, 0", 'value': "999"}],
+            # The maximum score of a round updated earlier in the same file counts
+            [{'kind': 'round', 'name': "Round, 0", 'value': "5"},
+             {'kind': 'answer', 'team': "Team 0", 'round': "Round, 0", 'value': "6"}],
+            [{'kind': 'round', 'name': "Round X", 'value': "5"},
+             {'kind': 'answer', 'team': "Team 0", 'round': "Round X", 'value': "5.5"}],
+        ]
+        for records in invalid:
+            with self.subTest(records=records), self.assertRaises(TransferError):
+                import_records(records, chunk_size=1)
+        self.assertEqual(self.snapshot(), expected)
+
+        import_records([{'kind': 'round', 'name': "Round, 0", 'value': "20"},
+                        {'kind': 'answer', 'team': "Team 0", 'round': "Round, 0", 'value': "15.5"}])
+        self.assertEqual(Answer.objects.get(team__team_name="Team 0", rnd__round_name="Round, 0").score, Decimal("15.5"))
+
+    def test_staff_endpoints(self):
+        User.objects.create_user(username="admin", password="secret", is_staff=True)
+        self.client.login(username="admin", password="secret")
+
+        response = self.client.get(reverse('export_quiz', args=('jsonl',)))
+        self.assertTrue(response.streaming)
+        content = b"".join(response.streaming_content)
+        self.assertEqual(len(content.splitlines()), 1 + 3 + 2 + 6)
+
+        upload = SimpleUploadedFile("kwis.jsonl", content.replace(b'"0.5"', b'"9.5"'))
+        response = self.client.post(reverse('import_quiz'), {'file': upload})
+        self.assertEqual(response.json()['imported']['answer'], 6)
+        self.assertEqual(Answer.objects.filter(score=Decimal("9.5")).count(), 2)
+
+    async def test_export_streamed_under_asgi(self):
+        user = await User.objects.acreate(username="admin", is_staff=True)
+        await self.async_client.aforce_login(user)
+        expected = await sync_to_async(lambda: ''.join(export_lines('jsonl')).encode())()
+
+        # A synchronous iterator would be read completely before sending anything, with a warning
+        with warnings.catch_warnings():
+            warnings.simplefilter('error')
+            response = await self.async_client.get(reverse('export_quiz', args=('jsonl',)))
+            self.assertTrue(response.is_async)
+            self.assertEqual(b"".join([part async for part in response.streaming_content]), expected)
+
+        parts = [part async for part in aexport_lines('jsonl', chunk_size=4)]
+        self.assertEqual(len(parts), 3)
+        self.assertEqual(''.join(parts).encode(), expected)
+
+    def test_endpoints_need_staff(self):
+        User.objects.create_user(username="jury", password="secret")
+        self.client.login(username="jury", password="secret")
+        self.assertEqual(self.client.get(reverse('export_quiz', args=('csv',))).status_code, 302)
+
+
+class AggregatesTestCase(TestCase):
+    def setUp(self):
+        self.teams = [Team.objects.create(team_name="Team %d" % i) for i in range(2)]
+        self.rounds = [Round.objects.create(round_name="Round %d" % i, max_score=10) for i in range(2)]
+
+    def assertTotals(self, totals, counts):
+        self.assertEqual([(t.subtotal, t.max_total) for t in Team.objects.order_by('pk')], totals)
+        self.assertEqual([r.answered_count for r in Round.objects.order_by('pk')], counts)
+        self.assertEqual(aggregates.verify(), [])
+
+    def test_single_answers(self):
+        answer = Answer.objects.create(team=self.teams[0], rnd=self.rounds[0], score=Decimal("2.5"))
+        Answer.objects.create(team=self.teams[0], rnd=self.rounds[1], score=Decimal("0.1"))
+        Answer.objects.create(team=self.teams[1], rnd=self.rounds[1], score=Decimal("0.2"))
+        self.assertTotals([(Decimal("2.6"), 20), (Decimal("0.2"), 10)], [1, 2])
+
+        answer.score = 7
+        answer.save()
+        self.assertTotals([(Decimal("7.1"), 20), (Decimal("0.2"), 10)], [1, 2])
+
+        # Moving an answer to another round
+        answer.rnd = self.rounds[1]
+        Answer.objects.filter(team=self.teams[0], rnd=self.rounds[1]).delete()
+        answer.save()
+        self.assertTotals([(7, 10), (Decimal("0.2"), 10)], [0, 2])
+
+        self.rounds[1].max_score = 5
+        self.rounds[1].save()
+        self.assertTotals([(7, 5), (Decimal("0.2"), 5)], [0, 2])
+
+        self.rounds[1].delete()
+        self.assertTotals([(0, 0), (0, 0)], [0])
+
+    def test_bulk_answers(self):
+        answers = [Answer(team=team, rnd=self.rounds[0], score=3) for team in self.teams]
+        Answer.objects.bulk_create(answers)
+        aggregates.rebuild(team_ids=[self.teams[0].id], round_ids=[])
+        self.assertEqual(len(aggregates.verify()), 2)
+
+        out, err = io.StringIO(), io.StringIO()
+        call_command('rebuild_aggregates', stdout=out, stderr=err)
+        self.assertTotals([(3, 10), (3, 10)], [2, 0])
+
+
+class ServerTimingTestCase(TestCase):
+    def setUp(self):
+        chart_cache.clear()
+        timing_stats.clear()
+        Quiz.objects.create(name="Test quiz")
+        Round.objects.create(round_name="Round 1", max_score=10)
+
+    def test_histogram_percentiles(self):
+        histogram = Histogram()
+        for i in range(1, 101):
+            histogram.add(i / 1000)
+        # Estimates are bucket bounds, within the bucket growth factor
+        self.assertAlmostEqual(histogram.percentile(50), 0.05, delta=0.0125)
+        self.assertAlmostEqual(histogram.percentile(95), 0.095, delta=0.024)
+        self.assertEqual(histogram.percentile(100), 0.1)
+
+    def test_timing_header_and_page(self):
+        settings_override = override_settings(
+            MIDDLEWARE=['kwis.timing.ServerTimingMiddleware'] + settings.MIDDLEWARE,
+            TEMPLATES=[dict(settings.TEMPLATES[0], BACKEND='kwis.timing.TimedDjangoTemplates')],
+            KWIS_SERVER_TIMING=True, KWIS_CHART_WORKERS=0)
+        with settings_override:
+            response = self.client.get(reverse('ranking'))
+            self.assertRegex(response['Server-Timing'], r'sql;dur=[0-9.]+;desc="[1-9][0-9]* queries", tpl;dur=[0-9.]+, chart;dur=0.0, total;dur=')
+            response = self.client.get('/kwis/rnd_overview.png')
+            self.assertNotIn('chart;dur=0.0', response['Server-Timing'])
+
+            summaries = {summary['name']: summary for summary in timing_stats.summaries()}
+            self.assertEqual(summaries['ranking']['count'], 1)
+            self.assertGreater(summaries['ranking']['template'], 0)
+            self.assertGreater(summaries['rnd_overview']['chart'], 0)
+
+            User.objects.create_user(username="admin", password="secret", is_staff=True)
+            self.client.login(username="admin", password="secret")
+            self.assertContains(self.client.get(reverse('timings')), 'rnd_overview')
+
+
+@override_settings(KWIS_PRERENDER_CHARTS=True, KWIS_CHART_WORKERS=0)
+class PrerenderTestCase(TestCase):
+    def setUp(self):
+        self.media = tempfile.TemporaryDirectory()
+        self.settings_override = override_settings(MEDIA_ROOT=self.media.name)
+        self.settings_override.enable()
+        # A scheduled pre-rendering would run after the settings are restored, into the real MEDIA_ROOT
+        schedule_patch = mock.patch('kwis.signals.schedule_prerender')
+        self.schedule_prerender = schedule_patch.start()
+        self.addCleanup(schedule_patch.stop)
+        self.teams = [Team.objects.create(team_name="Team %s" % name) for name in "AB"]
+        self.rounds = [Round.objects.create(round_name="Round %d" % i, max_score=10) for i in range(2)]
+        for team in self.teams:
+            for rnd in self.rounds:
+                Answer.objects.create(team=team, rnd=rnd, score=5)
+
+    def tearDown(self):
+        self.settings_override.disable()
+        self.media.cleanup()
+
+    def test_prerender(self):
+        url = '/kwis/team/%d/result.png' % self.teams[0].id
+        self.assertEqual(prerender.chart_url('team_result', self.teams[0].id), url)
+
+        # All charts in both languages
+        self.assertEqual(prerender_charts(), 14)
+        self.assertEqual(prerender_charts(), 0)
+        version = get_data_version()
+        url = prerender.chart_url('team_result', self.teams[0].id)
+        self.assertEqual(url, '/media/charts/%d-en/team_result-%d.png' % (version, self.teams[0].id))
+        with open(os.path.join(self.media.name, 'charts', '%d-en' % version, 'team_result-%d.png' % self.teams[0].id), 'rb') as f:
+            self.assertTrue(f.read().startswith(b'\x89PNG'))
+
+        User.objects.create_user(username="jury", password="secret")
+        self.client.login(username="jury", password="secret")
+        self.assertContains(self.client.get(reverse('team_detail', args=[self.teams[0].id])), url)
+
+        # Only charts of which the data changed are rendered again
+        with self.captureOnCommitCallbacks(execute=True):
+            Answer.objects.filter(team=self.teams[0], rnd=self.rounds[0]).get().delete()
+        self.assertTrue(self.schedule_prerender.called)
+        rendered = prerender_charts()
+        self.assertLess(rendered, 14)
+        directories = sorted(os.listdir(os.path.join(self.media.name, 'charts')))
+        self.assertEqual(len(directories), 4)
+        unchanged = 'team_result-%d.png' % self.teams[1].id
+        self.assertTrue(os.path.samefile(os.path.join(self.media.name, 'charts', '%d-en' % version, unchanged),
+                                         os.path.join(self.media.name, 'charts', '%d-en' % get_data_version(), unchanged)))
+
+        # Only the previous version is kept
+        with self.captureOnCommitCallbacks(execute=True):
+            Answer.objects.filter(team=self.teams[1], rnd=self.rounds[0]).get().delete()
+        prerender_charts()
+        self.assertEqual(len(os.listdir(os.path.join(self.media.name, 'charts'))), 4)
+        self.assertFalse(os.path.exists(os.path.join(self.media.name, 'charts', '%d-en' % version)))
+
+
+class ChartDataTestCase(TestCase):
+    def setUp(self):
+        self.teams = [Team.objects.create(team_name="Team %s" % name) for name in "ABCDE"]
+        self.round = Round.objects.create(round_name="Round 1", max_score=10)
+        Round.objects.create(round_name="Round 2", max_score=10)
+        for team, score in zip(self.teams, [1, 5, 5.5, 6, 10]):
+            Answer.objects.create(team=team, rnd=self.round, score=score)
+
+    def test_data_of_every_chart(self):
+        urls = ['/kwis/team_overview.json', '/kwis/rnd_overview.json', '/kwis/ranking/overview.json',
+                '/kwis/round/%d/result.json' % self.round.id, '/kwis/team/%d/result.json' % self.teams[0].id]
+        for url in urls:
+            response = self.client.get(url)
+            self.assertEqual(response['Content-Type'], 'application/json')
+            self.assertIn('labels', response.json())
+        self.assertEqual(self.client.get('/kwis/team/%d/result.json' % (self.teams[-1].id + 1)).status_code, 404)
+
+    def test_boxplot_statistics(self):
+        from matplotlib.cbook import boxplot_stats
+
+        boxes = self.client.get('/kwis/rnd_overview.json').json()['boxes']
+        self.assertIsNone(boxes[1])
+        expected = boxplot_stats([0.1, 0.5, 0.55, 0.6, 1.0])[0]
+        for key in ('q1', 'med', 'q3', 'mean', 'whislo', 'whishi'):
+            self.assertAlmostEqual(boxes[0][key], expected[key])
+        self.assertEqual(boxes[0]['fliers'], expected['fliers'].tolist())
+
+    def test_cached_by_data_version(self):
+        url = '/kwis/rnd_overview.json'
+        response = self.client.get(url)
+        self.assertNotIn('Cache-Control', response)
+        self.assertEqual(self.client.get(url, headers={'If-None-Match': response['ETag']}).status_code, 304)
+
+        # The data URL of the current version may be cached for good
+        response = self.client.get(url, {'v': response['ETag'].strip('"')})
+        self.assertIn('immutable', response['Cache-Control'])
+        with self.captureOnCommitCallbacks(execute=True):
+            Answer.objects.filter(rnd=self.round).first().delete()
+        self.assertNotIn('Cache-Control', self.client.get(url, {'v': response['ETag'].strip('"')}))
+
+    @override_settings(KWIS_CLIENT_CHARTS=True)
+    def test_client_charts(self):
+        User.objects.create_user(username="jury", password="secret")
+        self.client.login(username="jury", password="secret")
+        response = self.client.get(reverse('team_detail', args=[self.teams[0].id]))
+        self.assertContains(response, 'data-src="/kwis/team/%d/result.json?v=%s"' % (self.teams[0].id, data_etag(None)))
+        self.assertNotContains(response, 'result.png')
+
+
+class RoundStatisticsTestCase(CommittedTestCase):
+    def setUp(self):
+        Quiz.objects.create(name="Test quiz")
+        self.teams = [Team.objects.create(team_name="Team %d" % i) for i in range(6)]
+        self.rounds = [Round.objects.create(round_name="Round %d" % i, max_score=max_score) for i, max_score in enumerate([10, 20, 5])]
+        self.scores = {0: [1, 5, 5.5, 6, 10, 7], 1: [20, 0, 12.5], 2: []}
+        for col, scores in self.scores.items():
+            for team, score in zip(self.teams, scores):
+                Answer.objects.create(team=team, rnd=self.rounds[col], score=score)
+
+    def test_statistics(self):
+        from matplotlib.cbook import boxplot_stats
+
+        statistics = get_round_statistics()
+        for col, scores in self.scores.items():
+            summary = statistics.round(col)
+            self.assertEqual(summary['count'], len(scores))
+            self.assertEqual(summary['total'], sum(scores))
+            if not scores:
+                self.assertIsNone(summary['mean'])
+                self.assertIsNone(summary['box'])
+                self.assertEqual(summary['distribution'], [0] * 10)
+                continue
+            self.assertAlmostEqual(summary['mean'], np.mean(scores))
+            self.assertAlmostEqual(summary['std'], np.std(scores))
+            self.assertEqual([summary['q1'], summary['median'], summary['q3']], np.percentile(scores, [25, 50, 75]).tolist())
+            expected = boxplot_stats(np.array(scores) / float(self.rounds[col].max_score))[0]
+            for key in ('q1', 'med', 'q3', 'mean', 'whislo', 'whishi'):
+                self.assertAlmostEqual(summary['box'][key], expected[key])
+            self.assertEqual(summary['box']['fliers'], expected['fliers'].tolist())
+            self.assertEqual(sum(summary['distribution']), len(scores))
+        self.assertEqual(statistics.round(1)['distribution'], [1, 0, 0, 0, 0, 0, 1, 0, 0, 1])
+
+    def test_cached_per_data_version(self):
+        statistics = get_round_statistics()
+        self.assertIs(get_round_statistics(), statistics)
+        Answer.objects.create(team=self.teams[0], rnd=self.rounds[2], score=5)
+        self.assertIsNot(get_round_statistics(), statistics)
+        self.assertEqual(get_round_statistics().round(2)['mean'], 5)
+
+    def test_api_and_index(self):
+        rounds = self.client.get(reverse('api_rounds')).json()['rounds']
+        self.assertEqual([rnd['count'] for rnd in rounds], [6, 3, 0])
+        self.assertEqual(rounds[1]['median'], 12.5)
+        response = self.client.get(reverse('index'))
+        self.assertContains(response, '<td class="uk-text-right">5.8</td>')
@@ -0,0 +1,230 @@
+"""
+Timing of requests, enabled with KWIS_SERVER_TIMING.
+
+For every request the time spent in SQL queries, template rendering and chart rendering is measured.
+The measurements are sent to the browser in a Server-Timing header and collected per URL name
+in histograms kept by each process, shown to staff on the timings page.
+"""
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.db import connections
+from django.template.backends.django import DjangoTemplates
+
+_current = ContextVar('kwis_timings', default=None)
+
+
+class RequestTimings:
+    """
+    Durations in seconds measured during a single request.
+    """
+    def __init__(self):
+        self.sql_count = 0
+        self.durations = {'sql': 0.0, 'template': 0.0, 'chart': 0.0}
+
+    def add(self, name, duration):
+        self.durations[name] += duration
+
+
+@contextmanager
+def measure(name):
+    """
+    Add the time spent in the block to the given part of the current request, if it is timed.
+    """
+    timings = _current.get()
+    if timings is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.add(name, time.perf_counter() - start)
+
+
+def _sql_wrapper(timings):
+    def wrapper(execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            timings.sql_count += 1
+            timings.add('sql', time.perf_counter() - start)
+    return wrapper
+
+
+class Histogram:
+    """
+    Counts of durations in buckets, by default growing by a fixed factor, from which percentiles are estimated.
+    """
+    # Upper bounds in seconds, from 1 ms up to about 50 s
+    bounds = [0.001 * 1.25 ** i for i in range(50)]
+
+    def __init__(self, bounds=None):
+        if bounds is not None:
+            self.bounds = bounds
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, value):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+
+    def percentile(self, p):
+        """
+        Return the upper bound of the bucket holding the p-th percentile, not above the maximum seen.
+        """
+        if not self.count:
+            return None
+        rank, seen = p / 100 * self.count, 0
+        for bound, count in zip(self.bounds, self.counts):
+            seen += count
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+    def cumulative_counts(self):
+        """
+        Return (upper bound, number of values up to it) for every bucket, ending with infinity.
+        """
+        result, seen = [], 0
+        for bound, count in zip(self.bounds + [float('inf')], self.counts):
+            seen += count
+            result.append((bound, seen))
+        return result
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else None
+
+
+class EndpointStats:
+    """
+    Histogram of total request times of an endpoint, with the summed durations of its parts.
+    """
+    def __init__(self):
+        self.histogram = Histogram()
+        self.sql_count = 0
+        self.durations = {'sql': 0.0, 'template': 0.0, 'chart': 0.0}
+
+    def add(self, total, timings):
+        self.histogram.add(total)
+        self.sql_count += timings.sql_count
+        for name, duration in timings.durations.items():
+            self.durations[name] += duration
+
+    def summary(self, name):
+        """
+        Summary of the endpoint, with durations in milliseconds.
+        """
+        count = self.histogram.count
+        return {
+            'name': name,
+            'count': count,
+            'mean': self.histogram.mean * 1000,
+            'p50': self.histogram.percentile(50) * 1000,
+            'p95': self.histogram.percentile(95) * 1000,
+            'p99': self.histogram.percentile(99) * 1000,
+            'max': self.histogram.max * 1000,
+            'sql_count': self.sql_count / count,
+            'sql': self.durations['sql'] / count * 1000,
+            'template': self.durations['template'] / count * 1000,
+            'chart': self.durations['chart'] / count * 1000,
+        }
+
+
+class TimingStats:
+    """
+    Statistics of all endpoints requested in this process.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._endpoints = {}
+
+    def add(self, name, total, timings):
+        with self._lock:
+            self._endpoints.setdefault(name, EndpointStats()).add(total, timings)
+
+    def summaries(self):
+        """
+        Return a summary of every endpoint, slowest first by their 95th percentile.
+        """
+        with self._lock:
+            summaries = [stats.summary(name) for name, stats in self._endpoints.items()]
+        return sorted(summaries, key=lambda summary: summary['p95'], reverse=True)
+
+    def clear(self):
+        with self._lock:
+            self._endpoints.clear()
+
+
+timing_stats = TimingStats()
+
+
+def endpoint_name(request):
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return None
+    # Charts have no URL name
+    return match.url_name or match.func.__name__
+
+
+class ServerTimingMiddleware:
+    """
+    Time every request, add the timings to its response as a Server-Timing header and collect them per URL name.
+    """
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        timings = RequestTimings()
+        token = _current.set(timings)
+        start = time.perf_counter()
+        try:
+            with connections['default'].execute_wrapper(_sql_wrapper(timings)):
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        total = time.perf_counter() - start
+
+        response['Server-Timing'] = ', '.join([
+            'sql;dur=%.1f;desc="%d queries"' % (timings.durations['sql'] * 1000, timings.sql_count),
+            'tpl;dur=%.1f' % (timings.durations['template'] * 1000),
+            'chart;dur=%.1f' % (timings.durations['chart'] * 1000),
+            'total;dur=%.1f' % (total * 1000),
+        ])
+
+        name = endpoint_name(request)
+        if name is not None:
+            timing_stats.add(name, total, timings)
+        return response
+
+
+class TimedTemplate:
+    def __init__(self, template):
+        self.template = template
+
+    def __getattr__(self, name):
+        return getattr(self.template, name)
+
+    def render(self, context=None, request=None):
+        with measure('template'):
+            return self.template.render(context, request)
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    """
+    Django template backend measuring the time spent rendering templates.
+    """
+    def from_string(self, template_code):
+        return TimedTemplate(super().from_string(template_code))
+
+    def get_template(self, template_name):
+        return TimedTemplate(super().get_template(template_name))
@@ -0,0 +1,251 @@
+"""
+Import and export of all quiz data as CSV or JSON Lines.
+
+Every record has a kind and the fields name, team, round and value:
+- quiz: the quiz name, with the reveal count as value
+- team: the team name
+- round: the round name, with the maximum score as value
+- answer: the team and round names, with the score as value
+
+Teams and rounds are referred to by name, so that data can be moved between databases.
+Both directions stream the records, so memory use does not grow with the size of the data.
+"""
+import csv
+import json
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+
+from asgiref.sync import sync_to_async
+from django.core.exceptions import ValidationError
+from django.db import connection, transaction
+from django.utils.translation import gettext as _
+
+from .models import Answer, Quiz, Round, Team
+from .signals import quiz_imported
+
+FIELDS = ['kind', 'name', 'team', 'round', 'value']
+FORMATS = ['csv', 'jsonl']
+CHUNK_SIZE = 500
+
+
+class TransferError(ValueError):
+    """
+    Raised for records that cannot be imported. The import is rolled back.
+    """
+
+
+def export_records(chunk_size=CHUNK_SIZE):
+    """
+    Yield all quiz data as record dictionaries, teams and rounds before the answers referring to them.
+    """
+    for name, reveal_count in Quiz.objects.order_by('pk').values_list('name', 'reveal_count').iterator(chunk_size=chunk_size):
+        yield {'kind': 'quiz', 'name': name, 'team': '', 'round': '', 'value': str(reveal_count)}
+    for name in Team.objects.order_by('pk').values_list('team_name', flat=True).iterator(chunk_size=chunk_size):
+        yield {'kind': 'team', 'name': name, 'team': '', 'round': '', 'value': ''}
+    for name, max_score in Round.objects.order_by('pk').values_list('round_name', 'max_score').iterator(chunk_size=chunk_size):
+        yield {'kind': 'round', 'name': name, 'team': '', 'round': '', 'value': str(max_score)}
+    answers = Answer.objects.order_by('pk').values_list('team__team_name', 'rnd__round_name', 'score')
+    for team, rnd, score in answers.iterator(chunk_size=chunk_size):
+        yield {'kind': 'answer', 'name': '', 'team': team, 'round': rnd, 'value': str(score)}
+
+
+class _Line:
+    # File-like object handing back what the csv writer writes to it
+    def write(self, value):
+        return value
+
+
+def export_lines(fmt, chunk_size=CHUNK_SIZE):
+    """
+    Yield all quiz data as lines of text in the given format.
+    """
+    if fmt == 'csv':
+        writer = csv.DictWriter(_Line(), fieldnames=FIELDS)
+        yield writer.writeheader()
+        for record in export_records(chunk_size):
+            yield writer.writerow(record)
+    elif fmt == 'jsonl':
+        for record in export_records(chunk_size):
+            yield json.dumps(record) + '\n'
+    else:
+        raise TransferError(_("Unknown format: %(format)s") % {'format': fmt})
+
+
+async def aexport_lines(fmt, chunk_size=CHUNK_SIZE):
+    """
+    Yield all quiz data like export_lines, from an asynchronous iterator for streaming under ASGI,
+    where a synchronous iterator is read completely before anything is sent.
+    Lines are read a chunk at a time in the thread of the request, which keeps its database connection.
+    """
+    lines = export_lines(fmt, chunk_size)
+    read_chunk = sync_to_async(lambda: ''.join(islice(lines, chunk_size)))
+    try:
+        while chunk := await read_chunk():
+            yield chunk
+    finally:
+        await sync_to_async(lines.close)()
+
+
+def read_records(lines, fmt):
+    """
+    Parse lines of text in the given format into record dictionaries.
+    """
+    if fmt == 'csv':
+        try:
+            yield from csv.DictReader(lines)
+        except csv.Error as e:
+            raise TransferError(_("Invalid CSV: %(error)s") % {'error': e})
+    elif fmt == 'jsonl':
+        for number, line in enumerate(lines, 1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                raise TransferError(_("Line %(line)d is not valid JSON.") % {'line': number})
+            if not isinstance(record, dict):
+                raise TransferError(_("Line %(line)d is not a JSON object.") % {'line': number})
+            yield record
+    else:
+        raise TransferError(_("Unknown format: %(format)s") % {'format': fmt})
+
+
+def guess_format(filename):
+    """
+    Return the format matching the extension of a file name, or None.
+    """
+    if filename.endswith('.csv'):
+        return 'csv'
+    if filename.endswith(('.jsonl', '.ndjson')):
+        return 'jsonl'
+    return None
+
+
+def _decimal(value, number):
+    try:
+        value = Decimal(str(value).strip())
+    except InvalidOperation:
+        raise TransferError(_("Record %(number)d has an invalid value.") % {'number': number})
+    if not value.is_finite() or value < 0:
+        raise TransferError(_("Record %(number)d has an invalid value.") % {'number': number})
+    return value
+
+
+def _clean(model, field, value, number):
+    """
+    Validate a value like the model field does, e.g. its maximum length or number of digits and decimals.
+    """
+    try:
+        return model._meta.get_field(field).clean(value, None)
+    except ValidationError as e:
+        raise TransferError(_("Record %(number)d is invalid: %(error)s") % {'number': number, 'error': " ".join(e.messages)})
+
+
+class _Importer:
+    """
+    Collects records and writes them with bulk_create, one chunk of each kind at a time.
+    """
+    def __init__(self, chunk_size):
+        self.chunk_size = chunk_size
+        self.counts = {'quiz': 0, 'team': 0, 'round': 0, 'answer': 0}
+        self.teams, self.rounds, self.answers = [], [], []
+        # Ids of teams and rounds by name, to resolve the answers
+        self.team_ids = dict(Team.objects.values_list('team_name', 'id'))
+        self.round_ids = dict(Round.objects.values_list('round_name', 'id'))
+        # Maximum scores of the rounds by name, including those still waiting to be written
+        self.max_scores = dict(Round.objects.values_list('round_name', 'max_score'))
+
+    def add(self, number, record):
+        kind = record.get('kind')
+        if kind == 'quiz':
+            # There is a single quiz, whose state is replaced
+            quiz = Quiz.objects.order_by('pk').first() or Quiz()
+            quiz.name = _clean(Quiz, 'name', record.get('name'), number) if record.get('name') else quiz.name
+            quiz.reveal_count = int(_decimal(record.get('value') or 0, number))
+            quiz.save()
+        elif kind == 'team':
+            self.teams.append(Team(team_name=_clean(Team, 'team_name', self.name(record, 'name', number), number)))
+            if len(self.teams) >= self.chunk_size:
+                self.flush_teams()
+        elif kind == 'round':
+            name = _clean(Round, 'round_name', self.name(record, 'name', number), number)
+            max_score = _clean(Round, 'max_score', _decimal(record.get('value'), number), number)
+            self.rounds.append(Round(round_name=name, max_score=max_score))
+            self.max_scores[name] = max_score
+            if len(self.rounds) >= self.chunk_size:
+                self.flush_rounds()
+        elif kind == 'answer':
+            team, rnd = self.name(record, 'team', number), self.name(record, 'round', number)
+            if team not in self.team_ids or rnd not in self.round_ids:
+                # The team or round might still be waiting to be written
+                self.flush_teams()
+                self.flush_rounds()
+            if team not in self.team_ids or rnd not in self.round_ids:
+                raise TransferError(_("Record %(number)d refers to an unknown team or round.") % {'number': number})
+            # The same rules as the score forms
+            score = _clean(Answer, 'score', _decimal(record.get('value'), number), number)
+            if score > self.max_scores[rnd]:
+                raise TransferError(_("Record %(number)d has a score above the maximum score of its round.") % {'number': number})
+            self.answers.append(Answer(team_id=self.team_ids[team], rnd_id=self.round_ids[rnd], score=score))
+            if len(self.answers) >= self.chunk_size:
+                self.flush_answers()
+        else:
+            raise TransferError(_("Record %(number)d has an unknown kind.") % {'number': number})
+        self.counts[kind] += 1
+
+    @staticmethod
+    def name(record, field, number):
+        name = (record.get(field) or '').strip()
+        if not name:
+            raise TransferError(_("Record %(number)d has no %(field)s.") % {'number': number, 'field': field})
+        return name
+
+    def flush_teams(self):
+        if self.teams:
+            Team.objects.bulk_create(self.teams, ignore_conflicts=True)
+            names = [team.team_name for team in self.teams]
+            self.team_ids.update(Team.objects.filter(team_name__in=names).values_list('team_name', 'id'))
+            self.teams = []
+
+    def flush_rounds(self):
+        if self.rounds:
+            Round.objects.bulk_create(self.rounds, update_conflicts=True,
+                                      unique_fields=['round_name'], update_fields=['max_score'])
+            names = [rnd.round_name for rnd in self.rounds]
+            self.round_ids.update(Round.objects.filter(round_name__in=names).values_list('round_name', 'id'))
+            self.rounds = []
+
+    def flush_answers(self):
+        if self.answers:
+            Answer.objects.bulk_create(self.answers, update_conflicts=True,
+                                       unique_fields=['team', 'rnd'], update_fields=['score'])
+            self.answers = []
+
+    def flush(self):
+        self.flush_teams()
+        self.flush_rounds()
+        self.flush_answers()
+
+
+def import_records(records, replace=False, chunk_size=CHUNK_SIZE):
+    """
+    Write the given records to the database in a single transaction, adding to or updating existing data.
+    With replace, all teams, rounds and answers are removed first.
+    Returns the number of records imported of each kind.
+    """
+    with transaction.atomic():
+        if replace:
+            # Deleted without sending signals for every object, quiz_imported takes care of everything at once
+            with connection.cursor() as cursor:
+                for model in (Answer, Team, Round):
+                    cursor.execute("DELETE FROM %s" % connection.ops.quote_name(model._meta.db_table))
+
+        importer = _Importer(chunk_size)
+        for number, record in enumerate(records, 1):
+            importer.add(number, record)
+        importer.flush()
+
+        # Bulk writes bypass the model signals
+        quiz_imported.send(sender=Quiz)
+
+    return importer.counts
@@ -1,26 +1,35 @@
 from django.urls import path
 from django.contrib import admin
-from django.views.decorators.cache import cache_page
 from . import views
 
-cache_timeout = 5  # seconds
-
 admin.site.site_title = "Kwispel Admin"
 admin.site.site_header = "Kwispel Administration"
 admin.site.index_title = "Kwispel Admin Portal"
 
 urlpatterns = [
     path('', views.index, name='index'),
-    path('team_overview.png', cache_page(cache_timeout)(views.team_overview)),
-    path('rnd_overview.png', cache_page(cache_timeout)(views.rnd_overview)),
+    path('team_overview.png', views.team_overview),
+    path('team_overview.json', views.chart_data, {'kind': 'team_overview'}, name='team_overview_data'),
+    path('rnd_overview.png', views.rnd_overview),
+    path('rnd_overview.json', views.chart_data, {'kind': 'rnd_overview'}, name='rnd_overview_data'),
     path('ranking/', views.ranking, name='ranking'),
-    path('ranking/overview.png', cache_page(cache_timeout)(views.ranking_overview)),
+    path('ranking/overview.png', views.ranking_overview),
+    path('ranking/overview.json', views.chart_data, {'kind': 'ranking_overview'}, name='ranking_overview_data'),
     path('round/<int:rnd_id>', views.rnd_detail, name='rnd_detail'),
-    path('round/<int:rnd_id>/result.png', cache_page(cache_timeout)(views.rnd_result)),
+    path('round/<int:rnd_id>/scores', views.rnd_scores, name='rnd_scores'),
+    path('round/<int:rnd_id>/result.png', views.rnd_result),
+    path('round/<int:rnd_id>/result.json', views.chart_data, {'kind': 'rnd_result'}, name='rnd_result_data'),
     path('team/<int:team_id>', views.team_detail, name='team_detail'),
-    path('team/<int:team_id>/result.png', cache_page(cache_timeout)(views.team_result)),
+    path('team/<int:team_id>/result.png', views.team_result),
+    path('team/<int:team_id>/result.json', views.chart_data, {'kind': 'team_result'}, name='team_result_data'),
     path('vote/<int:rnd_id>/<int:team_id>', views.vote, name='vote'),
     path('delete/<int:rnd_id>/<int:team_id>', views.delete, name='delete'),
     path('reveal_next', views.reveal_next, name='reveal_next'),
     path('trigger_refresh', views.trigger_refresh_view, name='trigger_refresh'),
+    path('api/scores', views.api_scores, name='api_scores'),
+    path('api/rounds', views.api_rounds, name='api_rounds'),
+    path('export.<str:fmt>', views.export_quiz, name='export_quiz'),
+    path('import', views.import_quiz, name='import_quiz'),
+    path('timings', views.timings, name='timings'),
+    path('metrics', views.metrics, name='metrics'),
 ]
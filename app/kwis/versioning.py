@@ -0,0 +1,52 @@
+import hashlib
+import time
+
+from django.core.cache import cache
+from django.utils.translation import get_language
+
+DATA_VERSION_KEY = 'kwis:data_version'
+
+
+def get_data_version():
+    """
+    Return the version of the quiz data, which increases on every change to quizzes, teams, rounds and answers.
+    """
+    version = cache.get(DATA_VERSION_KEY)
+    if version is None:
+        # Start from the clock, so versions keep increasing when the cache is lost (e.g. after a restart)
+        cache.add(DATA_VERSION_KEY, time.time_ns() // 1000, timeout=None)
+        version = cache.get(DATA_VERSION_KEY)
+    return version
+
+
+def bump_data_version():
+    """
+    Increase the data version and return the new version.
+    """
+    try:
+        return cache.incr(DATA_VERSION_KEY)
+    except ValueError:
+        # Key is not yet available
+        get_data_version()
+        return cache.incr(DATA_VERSION_KEY)
+
+
+def data_etag(request, *args, **kwargs):
+    """
+    ETag for views that only depend on the quiz data and the active language, like charts.
+    """
+    return "%s-%s" % (get_data_version(), get_language())
+
+
+def page_etag(request, *args, **kwargs):
+    """
+    ETag for pages, which also depend on the user viewing them.
+
+    Pages of logged in users can hold forms, of which the CSRF token changes when logging in again.
+    The token read by the CSRF middleware is part of the ETag then, hashed to not repeat it in a header.
+    """
+    etag = "%s-%s" % (data_etag(request), request.user.pk or 0)
+    csrf_token = request.META.get('CSRF_COOKIE')
+    if request.user.is_authenticated and csrf_token:
+        etag += "-" + hashlib.sha256(csrf_token.encode()).hexdigest()[:12]
+    return etag
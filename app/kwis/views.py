@@ -1,27 +1,35 @@
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
 from django.shortcuts import get_object_or_404, render
-from django.http import HttpResponseRedirect, HttpResponse
+from django.http import Http404, HttpResponseRedirect, HttpResponse, JsonResponse, StreamingHttpResponse
 from django.urls import reverse
+from django.utils.cache import patch_cache_control
 from django import forms
 from django.utils.translation import gettext as _
 from django.contrib.auth.decorators import login_required
-
-from .models import Quiz, Round, Team, Answer
+from django.contrib.admin.views.decorators import staff_member_required
+from django.db import IntegrityError, transaction
+from django.middleware.csrf import CsrfViewMiddleware
+from django.utils.crypto import constant_time_compare
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import condition, require_POST
+
+from .charts import cache_chart, chart_response
+from .models import Quiz, Round, Team, Answer, ScoreBatch
+from .metrics import refresh_metrics
+from .ranking import get_ranking, get_ranking_history, get_round_progress
+from .round_statistics import get_round_statistics
+from .scores import from_tenths, get_score_matrix
+from .signals import answers_bulk_saved
+from .timing import timing_stats
+from .transfer import FORMATS, TransferError, aexport_lines, export_lines, guess_format, import_records, read_records
+from .versioning import data_etag, get_data_version, page_etag
 from .websocket_utils import trigger_refresh
 
+import codecs
+import hashlib
+import json
 import numpy as np
-import matplotlib.pyplot as plt
-from matplotlib.backends.backend_agg import FigureCanvasAgg as FigureCanvas
-from decimal import Decimal
-
-# Imports needed to generate graphs
-import matplotlib as mpl
-mpl.use('Agg')  # make sure no X backend is used
-
-# Dictionary to define color usage in graphs
-colors = {'score_good': 'green',
-          'score_bad': 'red',
-          'empty': 'lightblue',
-          }
 
 
 # Helper classes for forms
@@ -38,116 +46,75 @@ class ScoreForm(forms.Form):
     score = forms.DecimalField(max_digits=6, decimal_places=1, min_value=0)
 
 
-# Useful common functions
-def get_completed_rounds():
+class RoundScoresForm(forms.Form):
     """
-    Return a list of rounds that are completed by all teams.
-    A completed round has as much elements in its answer_set as there are participating teams.
+    Form with a score for every team in a round. Teams left blank are not changed.
     """
-    result = []
-    for rnd in Round.objects.all():
-        if rnd.answer_set.count() == Team.objects.count():
-            result.append(rnd)
-    return result
-
-
-def get_ranked_results(completed_rounds):
-    """
-    For the rounds given in completed_rounds, calculate the total score for each team.
-    Then all teams are sorted on total score and are given a ranking to allow for ex aequo scores.
-    """
-    results = []
-    for team in Team.objects.all():
-        teamtotal = 0
-        for a in team.answer_set.all():
-            # Only add results for complete rounds
-            if a.rnd in completed_rounds:
-                teamtotal += a.score
-        results.append((team.team_name, teamtotal))
-
-    # Sort the results
-    sorted_results = sorted(results, reverse=True, key=lambda tup: tup[1])
+    def __init__(self, teams, max_value, *args, **kwargs):
+        super(RoundScoresForm, self).__init__(*args, **kwargs)
+        self.teams = teams
+        for team in teams:
+            field = forms.DecimalField(max_digits=6, decimal_places=1, min_value=0, max_value=max_value,
+                                       required=False, label=team.team_name)
+            field.widget.attrs.update({"class": "uk-input"})
+            self.fields['team_%d' % team.id] = field
 
-    rank, count, previous, ranking = 0, 0, None, []
-    for key, num in sorted_results:
-        count += 1
-        if num != previous:
-            rank += count
-            previous = num
-            count = 0
-        ranking.append((rank, key, num))
+    def team_fields(self):
+        return [(team, self['team_%d' % team.id]) for team in self.teams]
 
-    return ranking
+    def scores(self):
+        return [(team, self.cleaned_data['team_%d' % team.id]) for team in self.teams
+                if self.cleaned_data['team_%d' % team.id] is not None]
 
 
-def dynamic_rotation(nbObjects):
-    if nbObjects <= 5:
-        return "horizontal"
-    else:
-        # return "vertical"
-        return 30
+# Useful common functions
+def matrix_position(index, pk):
+    """
+    Return the position of a team or round in the score matrix, or raise Http404 when it is unknown.
+    """
+    try:
+        return index[pk]
+    except KeyError:
+        raise Http404("No such team or round.")
 
 
 #   Initial views contain overviews only
+@condition(etag_func=page_etag)
 def index(request):
     """
     List all teams and all rounds. This is the main jury view from where to add scores.
     """
     quiz_name = Quiz.objects.first().name
-    round_list = Round.objects.all()
-    team_list = Team.objects.all()
+
+    # Totals and answer counts are stored on the teams and rounds
+    team_list = Team.objects.order_by('-subtotal', 'pk')
+    team_status = [(t, "%.1f / %.1f" % (t.subtotal, t.max_total), t.subtotal) for t in team_list]
+
+    # Average and median score per round, computed once per data version
+    statistics = get_round_statistics()
+    round_index = statistics.matrix.round_index
 
     round_status = []
-    for r in round_list:
-        if r.answer_set.count() == team_list.count():
+    for r in Round.objects.order_by('pk'):
+        if r.answered_count == len(team_list):
             # Translators: This indicates all scores for a round have been entered
-            round_status.append((r, _("Complete")))
+            status = _("Complete")
         else:
-            round_status.append((r, _("%(nrteams)d / %(totalteams)d teams") % {"nrteams": r.answer_set.count(), "totalteams": team_list.count()}))
-
-    team_status = []
-    for t in team_list:
-        subtotal = 0
-        maxtotal = 0
-        for ts in t.answer_set.all():
-            subtotal += ts.score
-            maxtotal += ts.rnd.max_score
-        team_status.append((t, "%.1f / %.1f" % (subtotal, maxtotal), subtotal))
-    team_status.sort(key=lambda tup: tup[2], reverse=True)
+            status = _("%(nrteams)d / %(totalteams)d teams") % {"nrteams": r.answered_count, "totalteams": len(team_list)}
+        summary = statistics.round(round_index[r.id]) if r.id in round_index else {}
+        round_status.append((r, status, summary.get('mean'), summary.get('median')))
 
     context = {'round_list': round_status, 'team_list': team_status, 'quiz_name': quiz_name}
     return render(request, 'index.html', context)
 
 
+@condition(etag_func=page_etag)
 def ranking(request):
     """
     This is the main view for contestants: ranking of teams based on their results.
     """
 
-    # First identify completed rounds.
-    rnd_complete = get_completed_rounds()
-
-    # Nothing to hide
-    hidden = 0
-
-    if len(rnd_complete) == Round.objects.count():
-        # Translators: This indicates all scores for all rounds have been entered
-        caption = _("Final ranking")
-        # Hiding the final top 3 from the ranking view for dramatic effect
-        quiz = Quiz.objects.first()
-        hidden = max(0, 3 - quiz.reveal_count) if quiz else 3
-    elif len(rnd_complete) == 0:
-        # Translators: This indicates no round has all scores entered
-        caption = _("No results yet")
-    else:
-        caption = _("Ranking after ")
-        for rnd in rnd_complete:
-            caption += rnd.round_name + ", "
-        caption = caption[:-2]  # Remove final ", "
-
-    ranking = get_ranked_results(rnd_complete)
-
-    return render(request, 'ranking.html', {'sorted': ranking, 'caption': caption, 'hidden': hidden, 'quiz_name': Quiz.objects.first().name})
+    return render(request, 'ranking.html', get_ranking())
 
 
 @login_required
@@ -157,20 +124,16 @@ def rnd_detail(request, rnd_id):
     """
     rnd = get_object_or_404(Round, pk=rnd_id)
 
-    # Filter a list of answers for this round
-    ar = rnd.answer_set.all()
+    # List of answers for this round, with their teams
+    answers = rnd.answer_set.select_related('team').order_by('pk')
 
     # Create a list of teams that don't have a score in this round yet
-    team_list_todo = []
-    for t in Team.objects.order_by('team_name'):
-        if ar.filter(team=t).count() == 0:
-            team_list_todo.append(t)
-    # Teams that already have a score in this round can be accessed from the template using the _set
+    team_list_todo = Team.objects.exclude(answer__rnd=rnd).order_by('team_name')
 
     # Create form to be used for all other teams
     form = ScoreForm(max_value=rnd.max_score)
 
-    return render(request, 'rnd_detail.html', {'rnd': rnd, 'team_list_todo': team_list_todo, 'form': form})
+    return render(request, 'rnd_detail.html', {'rnd': rnd, 'answers': answers, 'team_list_todo': team_list_todo, 'form': form})
 
 
 @login_required
@@ -181,22 +144,182 @@ def team_detail(request, team_id):
     # Check if team entry exists
     team = get_object_or_404(Team, pk=team_id)
 
-    # Count all results for this team
-    subtotal = 0
-    maxtotal = 0
-    alist = team.answer_set.order_by('rnd')
-    for a in alist:
-        subtotal += a.score
-        maxtotal += a.rnd.max_score
-
     # Create a list of rounds that have no results yet for this team
     round_list_todo = []
-    for r in Round.objects.all():
-        if alist.filter(rnd=r).count() == 0:
-            form = ScoreForm(max_value=r.max_score)
-            round_list_todo.append((r, form))
+    for r in Round.objects.exclude(answer__team=team).order_by('pk'):
+        form = ScoreForm(max_value=r.max_score)
+        round_list_todo.append((r, form))
+
+    # List of answers for this team, with their rounds
+    answers = team.answer_set.select_related('rnd').order_by('pk')
+
+    return render(request, 'team_detail.html', {'team': team, 'answers': answers, 'subtotal': team.subtotal, 'maxtotal': team.max_total, 'round_list_todo': round_list_todo})
+
+
+@login_required
+def rnd_scores(request, rnd_id):
+    """
+    Enter the scores of all teams for a round at once
+    """
+    rnd = get_object_or_404(Round, pk=rnd_id)
+    teams = list(Team.objects.order_by('team_name'))
+    current = dict(rnd.answer_set.values_list('team_id', 'score'))
+
+    if request.method == 'POST':
+        form = RoundScoresForm(teams, rnd.max_score, request.POST)
+        if form.is_valid():
+            answers = [Answer(team=team, rnd=rnd, score=score) for team, score in form.scores()]
+            # Insert or update all answers in one statement, based on the unique_team_round_answer constraint
+            with transaction.atomic():
+                Answer.objects.bulk_create(answers, update_conflicts=True,
+                                           unique_fields=['team', 'rnd'], update_fields=['score'])
+                answers_bulk_saved.send(sender=Answer, answers=answers)
+
+            return HttpResponseRedirect(reverse('rnd_detail', args=(rnd.id,)))
+    else:
+        form = RoundScoresForm(teams, rnd.max_score, initial={'team_%d' % team_id: score for team_id, score in current.items()})
 
-    return render(request, 'team_detail.html', {'team': team, 'subtotal': subtotal, 'maxtotal': maxtotal, 'round_list_todo': round_list_todo})
+    return render(request, 'rnd_scores.html', {'rnd': rnd, 'form': form})
+
+
+def batch_item_id(item, field):
+    """
+    Id of a team or round in an item of a score batch, or None. JSON true and false are ints in Python.
+    """
+    value = item.get(field)
+    return value if isinstance(value, int) and not isinstance(value, bool) else None
+
+
+def validate_score_batch(items):
+    """
+    Validate a list of {"team": id, "round": id, "score": value} items of a score batch.
+    Returns the answers to save and a dictionary of errors per item index.
+    """
+    if not isinstance(items, list) or not all(isinstance(item, dict) for item in items):
+        return [], {'scores': _("A list of scores is required.")}
+
+    teams = Team.objects.in_bulk([batch_item_id(item, 'team') for item in items if batch_item_id(item, 'team') is not None])
+    rounds = Round.objects.in_bulk([batch_item_id(item, 'round') for item in items if batch_item_id(item, 'round') is not None])
+
+    answers, errors, seen = [], {}, set()
+    for index, item in enumerate(items):
+        team, rnd = teams.get(batch_item_id(item, 'team')), rounds.get(batch_item_id(item, 'round'))
+        if team is None or rnd is None:
+            errors[index] = _("Unknown team or round.")
+            continue
+        if (team.id, rnd.id) in seen:
+            errors[index] = _("A team can only have one answer per round.")
+            continue
+        seen.add((team.id, rnd.id))
+
+        form = ScoreForm(max_value=rnd.max_score, data={'score': item.get('score')})
+        if not form.is_valid():
+            errors[index] = " ".join(form.errors['score'])
+            continue
+        answers.append(Answer(team=team, rnd=rnd, score=form.cleaned_data['score']))
+
+    return answers, errors
+
+
+def api_authentication_error(request):
+    """
+    Check that a request is made with the API token or by a logged in user, returning an error response if not.
+    Requests with a session must pass the CSRF check like forms do, e.g. with an X-CSRFToken header.
+    """
+    token = settings.KWIS_API_TOKEN
+    if token and constant_time_compare(request.headers.get('Authorization', ''), 'Bearer ' + token):
+        return None
+    if not request.user.is_authenticated:
+        return JsonResponse({'error': _("Authentication required.")}, status=401)
+    if CsrfViewMiddleware(lambda request: None).process_view(request, None, (), {}) is not None:
+        return JsonResponse({'error': _("CSRF verification failed.")}, status=403)
+    return None
+
+
+def stale_version_error(if_match):
+    """
+    Check that an If-Match header, if any, holds the current data version, returning an error response if not.
+    """
+    if if_match is not None and if_match.strip('"') != str(get_data_version()):
+        return JsonResponse({'error': _("The quiz data has changed."), 'version': get_data_version()}, status=412)
+    return None
+
+
+@csrf_exempt
+@require_POST
+def api_scores(request):
+    """
+    Save a batch of scores posted as JSON: {"scores": [{"team": id, "round": id, "score": value}, ...]}.
+    Devices authenticate with "Authorization: Bearer <KWIS_API_TOKEN>", pages of the site with their session.
+    The batch is identified by an Idempotency-Key header, so a client can safely retry it.
+    With an If-Match header holding the data version, the batch is only saved when no other changes were made.
+    The version is checked again in the transaction saving the batch, which holds the write lock of the database.
+    Changes committed by others are only counted once their version bump ran after their commit, though,
+    so a change committed just before the batch may still go unnoticed.
+    """
+    error = api_authentication_error(request)
+    if error is not None:
+        return error
+
+    key = request.headers.get('Idempotency-Key', '').strip()
+    if not key or len(key) > 200:
+        return JsonResponse({'error': _("An Idempotency-Key header is required.")}, status=400)
+
+    # A batch that was already saved gets the same response again
+    request_hash = hashlib.sha256(request.body).hexdigest()
+    batch = ScoreBatch.objects.filter(idempotency_key=key).first()
+    if batch is not None:
+        return batch_response(batch, request_hash)
+
+    if_match = request.headers.get('If-Match')
+    error = stale_version_error(if_match)
+    if error is not None:
+        return error
+
+    try:
+        items = json.loads(request.body).get('scores')
+    except (ValueError, AttributeError):
+        return JsonResponse({'error': _("Invalid JSON.")}, status=400)
+
+    answers, errors = validate_score_batch(items)
+    if errors:
+        return JsonResponse({'errors': errors}, status=400)
+
+    try:
+        with transaction.atomic():
+            # Other changes might have been made while the batch was validated
+            error = stale_version_error(if_match)
+            if error is not None:
+                return error
+            Answer.objects.bulk_create(answers, update_conflicts=True,
+                                       unique_fields=['team', 'rnd'], update_fields=['score'])
+            answers_bulk_saved.send(sender=Answer, answers=answers)
+            batch = ScoreBatch.objects.create(idempotency_key=key, request_hash=request_hash, response={'saved': len(answers)})
+    except IntegrityError:
+        # A batch with the same key was saved concurrently
+        return batch_response(ScoreBatch.objects.get(idempotency_key=key), request_hash)
+
+    # The data version is bumped once the batch is committed
+    batch.response['version'] = get_data_version()
+    batch.save(update_fields=['response'])
+    return JsonResponse(batch.response)
+
+
+def batch_response(batch, request_hash):
+    """
+    Response to a batch that was saved before, which is refused when the key was used for another request.
+    """
+    if batch.request_hash and batch.request_hash != request_hash:
+        return JsonResponse({'error': _("The Idempotency-Key was used for another batch.")}, status=422)
+    return JsonResponse(batch.response)
+
+
+@condition(etag_func=data_etag)
+def api_rounds(request):
+    """
+    Statistics of the scores of every round as JSON, see kwis.round_statistics.
+    """
+    return JsonResponse({'version': get_data_version(), 'rounds': get_round_statistics().rounds()})
 
 
 @login_required
@@ -281,148 +404,167 @@ def trigger_refresh_view(request):
     return HttpResponseRedirect(reverse('index'))
 
 
-def team_result(request, team_id):
+@staff_member_required
+def timings(request):
     """
-    Plot results per team
+    Request timings per URL name collected by this process, slowest first
     """
+    context = {'enabled': settings.KWIS_SERVER_TIMING, 'endpoints': timing_stats.summaries()}
+    return render(request, 'timings.html', context)
 
-    # Retrieve team info and scores for the team
-    ateam = get_object_or_404(Team, pk=team_id)
-    answers = ateam.answer_set.order_by('rnd')
 
-    # Set number of vertical bars
-    ind = np.arange(len(answers))
+def metrics(request):
+    """
+    Metrics of the websocket refresh path in Prometheus format, for staff or a scraper holding the metrics token
+    """
+    token = settings.KWIS_METRICS_TOKEN
+    authorized = request.user.is_staff or (token and constant_time_compare(request.headers.get('Authorization', ''), 'Bearer ' + token))
+    if not authorized:
+        return HttpResponse(status=403)
+    return HttpResponse(refresh_metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
 
-    # Retrieve score, max score and name per round
-    scores = [answer.score for answer in answers]
-    maxima = [(answer.rnd.max_score - answer.score) for answer in answers]
-    names = [answer.rnd.round_name for answer in answers]
-
-    # The image
-    fig, ax = plt.subplots(1, 1)
-    fig.set_tight_layout(True)
-
-    # Draw vertical bars
-    width = 0.25
-    ax.bar(ind, scores, width, color=colors['score_good'])
-    ax.bar(ind, maxima, width, color=colors['score_bad'], bottom=scores)
-
-    # Set labels
-    ax.set_xticks(ind)
-    ax.set_xticklabels(names, rotation=dynamic_rotation(Round.objects.count()), ha='right')
-    ax.set_xlabel(_("Rounds"))
-    ax.set_ylabel(_("Scores"))
-
-    ax.grid(True)
-    canvas = FigureCanvas(fig)
-    response = HttpResponse(content_type='image/png')
-
-    canvas.print_png(response)
+
+@staff_member_required
+def export_quiz(request, fmt):
+    """
+    Download all quiz data as CSV or JSON Lines, streamed while it is read from the database
+    """
+    if fmt not in FORMATS:
+        raise Http404
+    content_type = 'text/csv' if fmt == 'csv' else 'application/x-ndjson'
+    # Under ASGI the lines must come from an asynchronous iterator, or they are all read before sending any
+    lines = aexport_lines(fmt) if isinstance(request, ASGIRequest) else export_lines(fmt)
+    response = StreamingHttpResponse(lines, content_type=content_type + '; charset=utf-8')
+    response['Content-Disposition'] = 'attachment; filename="kwis.%s"' % fmt
     return response
 
 
-def rnd_result(request, rnd_id):
+@staff_member_required
+@require_POST
+def import_quiz(request):
     """
-    Plot results per round
+    Upload quiz data as CSV or JSON Lines, as downloaded from export_quiz.
+    With replace set, all teams, rounds and answers are removed first.
     """
+    upload = request.FILES.get('file')
+    if upload is None:
+        return JsonResponse({'error': _("No file uploaded.")}, status=400)
+    fmt = request.POST.get('format') or guess_format(upload.name)
+    if fmt not in FORMATS:
+        return JsonResponse({'error': _("Unknown format: %(format)s") % {'format': fmt}}, status=400)
 
-    # Retrieve round info and scores for round
-    arnd = get_object_or_404(Round, pk=rnd_id)
-    answers = arnd.answer_set.order_by('-score')
+    try:
+        counts = import_records(read_records(codecs.iterdecode(upload, 'utf-8'), fmt),
+                                replace=bool(request.POST.get('replace')))
+    except (UnicodeDecodeError, TransferError) as e:
+        return JsonResponse({'error': str(e)}, status=400)
 
-    # Set number of vertical bars
-    ind = np.arange(len(answers))
+    return JsonResponse({'imported': counts, 'version': get_data_version()})
 
-    # Retrieve score and team name per round
-    scores = [answer.score for answer in answers]
-    names = [answer.team.team_name for answer in answers]
 
-    # The image
-    fig, ax = plt.subplots(1, 1)
-    fig.set_tight_layout(True)
+def team_result_data(team_id):
+    """
+    Data of the chart of results per team
+    """
 
-    # Draw vertical bar
-    width = 0.25
-    ax.barh(ind, scores, width, color=colors['score_good'])
+    # Retrieve team info and scores for the team
+    matrix = get_score_matrix()
+    cols, answers = matrix.team_scores(matrix_position(matrix.team_index, team_id))
 
-    # Set labels
-    ax.set_yticks(ind)
-    ax.set_yticklabels(names)
-    ax.set_ylabel(_("Teams"))
-    ax.set_xlabel(_("Scores"))
+    # Retrieve score, max score and name per round
+    data = {
+        'scores': [float(from_tenths(score)) for score in answers],
+        'maxima': [float(from_tenths(matrix.max_scores[col] - score)) for col, score in zip(cols, answers)],
+        'names': [matrix.rounds[col].round_name for col in cols],
+        'round_count': len(matrix.rounds),
+        'labels': {'x': _("Rounds"), 'y': _("Scores")},
+    }
+    return data
+
+
+@condition(etag_func=data_etag)
+@cache_chart('team_result')
+def team_result(request, team_id):
+    """
+    Plot results per team
+    """
+    return chart_response(request, 'team_result', team_result_data(team_id))
 
-    ax.grid(True)
 
-    canvas = FigureCanvas(fig)
-    response = HttpResponse(content_type='image/png')
+def rnd_result_data(rnd_id):
+    """
+    Data of the chart of results per round
+    """
+
+    # Retrieve round info and scores for round, highest score first
+    matrix = get_score_matrix()
+    rows, answers = matrix.round_scores(matrix_position(matrix.round_index, rnd_id))
+    order = np.argsort(-answers, kind='stable')
 
-    canvas.print_png(response)
-    return response
+    # Retrieve score and team name per round
+    data = {
+        'scores': [float(from_tenths(answers[i])) for i in order],
+        'names': [matrix.teams[rows[i]].team_name for i in order],
+        'labels': {'x': _("Scores"), 'y': _("Teams")},
+    }
+    return data
 
 
-def team_overview(request):
+@condition(etag_func=data_etag)
+@cache_chart('rnd_result')
+def rnd_result(request, rnd_id):
     """
-    Plot overview of all teams
+    Plot results per round
     """
+    return chart_response(request, 'rnd_result', rnd_result_data(rnd_id))
 
-    # Cumulative scores per team
-    ind = np.arange(Team.objects.count())
 
+def team_overview_data():
+    """
+    Data of the overview chart of all teams
+    """
+
+    # Cumulative scores per team
     subtotals = []
     maxtotals = []
     names = []
-    for t in Team.objects.all():
-        subtotal = 0
-        maxtotal = 0
-        for ts in t.answer_set.all():
-            subtotal += ts.score
-            maxtotal += ts.rnd.max_score
-        subtotals.append(Decimal(subtotal))
+    for name, subtotal, maxtotal in Team.objects.order_by('pk').values_list('team_name', 'subtotal', 'max_total'):
+        subtotals.append(subtotal)
         maxtotals.append(maxtotal - subtotal)
-        names.append(t.team_name)
+        names.append(name)
 
     zipped = list(zip(subtotals, maxtotals, names))
     zipped.sort()
     if zipped:
         subtotals, maxtotals, names = zip(*zipped)
 
-    # The image
-    fig, ax = plt.subplots(1, 1)
-    fig.set_tight_layout(True)  # Ensure labels fit in image
+    data = {
+        'subtotals': [float(subtotal) for subtotal in subtotals],
+        'maxtotals': [float(maxtotal) for maxtotal in maxtotals],
+        'names': list(names),
+        'labels': {'x': _("Teams"), 'y': _("Cumulative score")},
+    }
+    return data
 
-    # Draw bars
-    width = 0.5
-    ax.bar(ind, subtotals, width, color=colors['score_good'])
-    ax.bar(ind, maxtotals, width, color=colors['score_bad'], bottom=subtotals)
 
-    # Set labels
-    ax.set_xticks(ind)
-    ax.set_xticklabels(names, rotation=dynamic_rotation(Team.objects.count()), ha='right')
-    ax.set_xlabel(_("Teams"))
-    ax.set_ylabel(_("Cumulative score"))
-
-    ax.grid(True)
-
-    for tl in ax.get_yticklabels():
-        tl.set_color(colors['score_good'])
-
-    canvas = FigureCanvas(fig)
-    response = HttpResponse(content_type='image/png')
-
-    canvas.print_png(response)
-    return response
+@condition(etag_func=data_etag)
+@cache_chart('team_overview')
+def team_overview(request):
+    """
+    Plot overview of all teams
+    """
+    return chart_response(request, 'team_overview', team_overview_data())
 
 
-def rnd_overview(request):
+def rnd_overview_data():
     """
-    Plot overview of all rounds
+    Data of the overview chart of all rounds
     """
 
-    # Number of teams determines max level of round completion
-    nbTeams = Team.objects.count()
-
-    # Number of bars
-    ind = np.arange(Round.objects.count())
+    # Progress per round, with the number of teams as max level of round completion
+    matrix = get_score_matrix()
+    progress = get_round_progress(matrix)
+    statistics = get_round_statistics(matrix)
 
     # Progress per round
     names = []  # Round names
@@ -430,122 +572,94 @@ def rnd_overview(request):
     maxima = []  # maxima for the already entered teams
     difference = []  # difference between maxima and scores obtained
     remaining = []  # max scores for teams not yet entered
-    data = []  # raw score data in % for boxplot
-    for r in Round.objects.all():
+    boxes = []  # boxplot statistics of the scores in %
+    for col, r in enumerate(progress):
         names.append(r.round_name)
-        rc = r.answer_set.count()
-
-        rs = 0
-        datalist = []
-        for a in r.answer_set.all():
-            rs += a.score
-            datalist.append(float(a.score) / float(r.max_score))
-        scores.append(rs)
-        maxima.append(r.max_score * rc)
-        difference.append(r.max_score * rc - rs)
-        remaining.append(r.max_score * (nbTeams - rc))
-        data.append(datalist)
-
-    # The image
-    fig, ax1 = plt.subplots(1, 1)
-    fig.set_tight_layout(True)  # Ensure labels fit in image
-    ax2 = ax1.twinx()
-
-    # Draw bars
-    barwidth = 0.5
-    boxwidth = barwidth / 2
-    barlocation = ind
-    ax1.bar(barlocation, scores, barwidth, color=colors['score_good'])
-    ax1.bar(barlocation, difference, barwidth, color=colors['score_bad'], bottom=scores)
-    ax1.bar(barlocation, remaining, barwidth, color=colors['empty'], bottom=maxima)
-    if data:
-        ax2.boxplot(data, widths=boxwidth, positions=barlocation, showmeans=True)
-
-    # Set labels
-    ax1.set_xticks(ind)
-    ax1.set_xticklabels(names, rotation=dynamic_rotation(Round.objects.count()), ha='right')
-    ax1.set_xlabel(_("Rounds"))
-    ax1.set_ylabel(_("Cumulative scores and progress"))
-    ax2.set_ylabel(_("Statistics"))
-    ax2.set_ylim([0, 1])
-
-    ax1.grid(True)
-
-    for tl in ax1.get_yticklabels():
-        tl.set_color(colors['score_good'])
-
-    for tl in ax2.get_yticklabels():
-        tl.set_color(colors['score_bad'])
-
-    canvas = FigureCanvas(fig)
-    response = HttpResponse(content_type='image/png')
-
-    canvas.print_png(response)
-    return response
+        rc = r.answer_count
+
+        rs = from_tenths(statistics.totals[col])
+        boxes.append(statistics.box(col))
+        scores.append(float(rs))
+        maxima.append(float(r.max_score * rc))
+        difference.append(float(r.max_score * rc - rs))
+        remaining.append(float(r.max_score * (r.team_count - rc)))
+
+    data = {
+        'names': names,
+        'scores': scores,
+        'maxima': maxima,
+        'difference': difference,
+        'remaining': remaining,
+        'boxes': boxes,
+        'labels': {'x': _("Rounds"), 'y': _("Cumulative scores and progress"), 'y2': _("Statistics")},
+    }
+    return data
+
+
+@condition(etag_func=data_etag)
+@cache_chart('rnd_overview')
+def rnd_overview(request):
+    """
+    Plot overview of all rounds
+    """
+    return chart_response(request, 'rnd_overview', rnd_overview_data())
 
 
-def ranking_overview(request):
+def ranking_overview_data():
     """
-    Show history of rankings for top N teams in current ranking
+    Data of the chart with the history of rankings for the top N teams in the current ranking
     """
 
     # Check which rounds are complete
-    rnd_complete = get_completed_rounds()
+    matrix = get_score_matrix()
+    progress = get_round_progress(matrix)
+    rnd_complete = progress.completed
 
     # Calculate ranking after each of these rounds
-    increment_rnds = []
-    ranking_matrix = []
-    round_names = []
-
-    for comprnd in rnd_complete:
-        increment_rnds.append(comprnd)
-        ranking = get_ranked_results(increment_rnds)
-        ranking_matrix.append(ranking)
-        round_names.append(comprnd.round_name)
+    history = get_ranking_history(rnd_complete, matrix)
 
     # Team leading after most recent round: compose line with rankings over all other rounds
     # next team idem until all N lines composed
     N = 5  # Number of top teams to track
-    if Team.objects.count() < N:
-        # Limit N to the amount of teams
-        N = Team.objects.count()
-    top_positions = []
-    team_names = []
-    if ranking_matrix:
-        for i in range(N):
-            position_list = []
-            # Find the name of the team that finished N + 1
-            tn = ranking_matrix[-1][i][1]
-            # Find the positions of this team over all rounds
-            for ranking in ranking_matrix:
-                ti = [x for x in ranking if tn in x][0]
-                position_list.append(ranking.index(ti) + 1)
-
-            top_positions.append(position_list)
-            team_names.append(tn)
-
-    # matrix transpose for easier plotting
-    position_sequence = [list(i) for i in zip(*top_positions)]
-
-    # The image
-    fig, ax1 = plt.subplots(1, 1, figsize=(7, 7))
-    fig.set_tight_layout(True)
-
-    # Invert y axis so that leading team is on top
-    ax1.invert_yaxis()
-
-    ax1.plot(position_sequence, linewidth=2)
-    ind = np.arange(len(round_names))
-    ax1.set_xticks(ind)
-    ax1.set_xticklabels(round_names, rotation=dynamic_rotation(Round.objects.count()), ha="right")
-    ax1.tick_params(axis='both', which='both', labelbottom=True, labeltop=False, labelleft=True, labelright=True)
-    ax1.set_xlabel(_("Round"))
-    ax1.set_ylabel(_("Position"))
-    ax1.legend(team_names, loc='best')
-    ax1.grid(True)
-
-    canvas = FigureCanvas(fig)
-    response = HttpResponse(content_type='image/png')
-
-    canvas.print_png(response)
+    top = history.top(N)
+
+    data = {
+        # One row per round, one column per team for easier plotting
+        'positions': history.ranks[top].T.tolist(),
+        'team_names': [history.team_names[i] for i in top],
+        'round_names': history.round_names,
+        'round_count': len(progress),
+        'labels': {'x': _("Round"), 'y': _("Position")},
+    }
+    return data
+
+
+@condition(etag_func=data_etag)
+@cache_chart('ranking_overview')
+def ranking_overview(request):
+    """
+    Show history of rankings for top N teams in current ranking
+    """
+    return chart_response(request, 'ranking_overview', ranking_overview_data())
+
+
+# Functions computing the data of every kind of chart
+chart_data_functions = {
+    'team_result': team_result_data,
+    'rnd_result': rnd_result_data,
+    'team_overview': team_overview_data,
+    'rnd_overview': rnd_overview_data,
+    'ranking_overview': ranking_overview_data,
+}
+
+
+@condition(etag_func=data_etag)
+def chart_data(request, kind, **kwargs):
+    """
+    Data of a chart as JSON, to draw it in the browser (see static/js/charts.js).
+    The data of the current version, as requested with ?v=<ETag>, does not change and may be cached for good.
+    """
+    response = JsonResponse(chart_data_functions[kind](**kwargs), json_dumps_params={'separators': (',', ':')})
+    if request.GET.get('v') == data_etag(request):
+        patch_cache_control(response, public=True, max_age=365 * 24 * 60 * 60, immutable=True)
     return response
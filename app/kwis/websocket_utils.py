@@ -1,14 +1,93 @@
+import json
+import logging
+import threading
+import time
+
 from channels.layers import get_channel_layer
 from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.db import connections
+
+from .metrics import refresh_metrics
+from .ranking import get_ranking_update
+
+logger = logging.getLogger(__name__)
 
 
 # Helper function to trigger refresh via websocket
 def trigger_refresh():
     """
-    Trigger a refresh event to all connected clients
+    Trigger a refresh event to all connected clients.
+    The new ranking is computed and serialized once, and sent as is to every client.
     """
     channel_layer = get_channel_layer()
-    async_to_sync(channel_layer.group_send)(  # type: ignore
-        "refresh_group",
-        {"type": "refresh_page"}
-    )
+    text = json.dumps(get_ranking_update())
+    try:
+        # The send time lets consumers measure how long the broadcast took to reach them
+        async_to_sync(channel_layer.group_send)(  # type: ignore
+            "refresh_group",
+            {"type": "refresh_page", "text": text, "sent_at": time.time()}
+        )
+    except Exception:
+        refresh_metrics.error()
+        raise
+    refresh_metrics.broadcast_sent()
+
+
+class RefreshScheduler:
+    """
+    Coalesces refresh requests into a single broadcast.
+
+    A refresh is sent once no new request came in for the debounce time, but never later than
+    the maximum delay after the first request. A burst of score entries thus results in one broadcast.
+    Subclasses coalesce other work by overriding run() and the settings.
+    """
+    # Settings holding the debounce time and the maximum delay, with their defaults
+    debounce_setting = ('KWIS_REFRESH_DEBOUNCE', 0.5)
+    max_delay_setting = ('KWIS_REFRESH_MAX_DELAY', 2.0)
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._timer = None
+        self._first_request = None
+
+    def schedule(self):
+        debounce = getattr(settings, *self.debounce_setting)
+        max_delay = getattr(settings, *self.max_delay_setting)
+        with self._lock:
+            now = time.monotonic()
+            if self._first_request is None:
+                self._first_request = now
+            deadline = min(now + debounce, self._first_request + max_delay)
+
+            if self._timer is not None:
+                self._timer.cancel()
+            self._timer = threading.Timer(max(0.0, deadline - now), self._fire)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def run(self):
+        trigger_refresh()
+
+    def _fire(self):
+        with self._lock:
+            self._timer = None
+            self._first_request = None
+        try:
+            self.run()
+        except Exception:
+            logger.exception("Scheduled %s failed", type(self).__name__)
+        finally:
+            # The database connection of this thread is not reused
+            connections.close_all()
+
+
+refresh_scheduler = RefreshScheduler()
+
+
+def schedule_refresh():
+    """
+    Schedule a coalesced refresh of all connected clients, see RefreshScheduler.
+    """
+    if getattr(settings, 'KWIS_AUTO_REFRESH', True):
+        refresh_scheduler.schedule()
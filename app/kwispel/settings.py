@@ -78,6 +78,13 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'kwispel.wsgi.application'
+
+# Measure SQL, template and chart time of every request, sent in a Server-Timing header
+# and shown to staff on the timings page. Off by default, as the header tells how the server spends its time.
+KWIS_SERVER_TIMING = bool(int(os.environ.get("KWIS_SERVER_TIMING", default=0)))
+if KWIS_SERVER_TIMING:
+    MIDDLEWARE.insert(0, 'kwis.timing.ServerTimingMiddleware')
+    TEMPLATES[0]['BACKEND'] = 'kwis.timing.TimedDjangoTemplates'
 ASGI_APPLICATION = 'kwispel.asgi.application'
 
 CHANNEL_LAYERS = {
@@ -99,6 +106,32 @@ DATABASES = {
     }
 }
 
+# SQLite profile for many readers with a few concurrent writers (measure with ./manage.py bench_sqlite):
+# - the write-ahead log lets readers continue while a score is written,
+# - writers wait for the lock up to the timeout (seconds) instead of failing with "database is locked",
+# - transactions take the write lock when they start, so they cannot deadlock upgrading a read lock,
+# - connections get a larger page cache and memory mapped reads.
+# Connections are closed after every request by default, as the app runs under Daphne: Django does not reuse
+# connections under ASGI, where every request runs in a thread context of its own, so kept connections only pile up.
+# Set KWIS_SQLITE_CONN_MAX_AGE (seconds) to keep them open between requests when serving through WSGI, e.g. Gunicorn.
+KWIS_SQLITE_TIMEOUT = int(os.environ.get("KWIS_SQLITE_TIMEOUT", default=20))
+KWIS_SQLITE_PROFILE = {
+    'CONN_MAX_AGE': int(os.environ.get("KWIS_SQLITE_CONN_MAX_AGE", default=0)),
+    'CONN_HEALTH_CHECKS': True,
+    'OPTIONS': {
+        'timeout': KWIS_SQLITE_TIMEOUT,
+        'transaction_mode': 'IMMEDIATE',
+        'init_command': ';'.join([
+            'PRAGMA journal_mode=WAL',
+            'PRAGMA synchronous=NORMAL',
+            'PRAGMA cache_size=-20000',  # in KiB
+            'PRAGMA mmap_size=134217728',
+        ]),
+    },
+}
+if bool(int(os.environ.get("KWIS_SQLITE_CONCURRENT", default=1))):
+    DATABASES['default'].update(KWIS_SQLITE_PROFILE)
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -144,6 +177,10 @@ STATIC_URL = 'static/'
 STATIC_ROOT = BASE_DIR / "staticfiles"
 STATICFILES_DIRS = []
 
+# Files written by the application, like pre-rendered charts, served by the web server
+MEDIA_URL = 'media/'
+MEDIA_ROOT = BASE_DIR / "mediafiles"
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
@@ -151,9 +188,87 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 # Cache settings
 # https://docs.djangoproject.com/en/5.2/topics/cache/
-CACHES = {
-    'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
-        'LOCATION': 'unique-snowflake',
+# The default cache holds the quiz data version, the charts cache holds rendered charts.
+# Set KWIS_CACHE_URL to share both between processes: redis://host:port/db, using a database of its own
+# as clearing the cache empties the database, or file:///path for a directory on a disk shared by the processes,
+# which count the data version under a lock on a file in there.
+# Without it, every process keeps its own caches in memory.
+KWIS_CACHE_URL = os.environ.get("KWIS_CACHE_URL", default="")
+
+# Number and total bytes of rendered charts kept in memory when the cache is not shared, and seconds they are kept.
+# A shared cache is bounded by its own server, e.g. with maxmemory for Redis.
+KWIS_CHART_CACHE_ENTRIES = int(os.environ.get("KWIS_CHART_CACHE_ENTRIES", default=128))
+KWIS_CHART_CACHE_BYTES = int(os.environ.get("KWIS_CHART_CACHE_BYTES", default=64 * 1024 * 1024))
+KWIS_CHART_CACHE_TIMEOUT = int(os.environ.get("KWIS_CHART_CACHE_TIMEOUT", default=24 * 60 * 60))
+
+if KWIS_CACHE_URL.startswith(("redis://", "rediss://")):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': KWIS_CACHE_URL,
+            'KEY_PREFIX': 'kwis',
+        },
+        'charts': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': KWIS_CACHE_URL,
+            'KEY_PREFIX': 'kwis-charts',
+            'TIMEOUT': KWIS_CHART_CACHE_TIMEOUT,
+        },
+    }
+elif KWIS_CACHE_URL.startswith("file://"):
+    CACHES = {
+        'default': {
+            'BACKEND': 'kwis.cache.FileBasedCache',
+            'LOCATION': os.path.join(KWIS_CACHE_URL[len("file://"):], 'default'),
+        },
+        'charts': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': os.path.join(KWIS_CACHE_URL[len("file://"):], 'charts'),
+            'TIMEOUT': KWIS_CHART_CACHE_TIMEOUT,
+        },
     }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'unique-snowflake',
+        },
+        'charts': {
+            'BACKEND': 'kwis.cache.BoundedLocMemCache',
+            'LOCATION': 'kwis-charts',
+            'TIMEOUT': KWIS_CHART_CACHE_TIMEOUT,
+            'OPTIONS': {'MAX_ENTRIES': KWIS_CHART_CACHE_ENTRIES, 'MAX_BYTES': KWIS_CHART_CACHE_BYTES},
+        },
+    }
+
+# Number of worker processes rendering charts, 0 to render in the web process itself
+KWIS_CHART_WORKERS = int(os.environ.get("KWIS_CHART_WORKERS", default=2))
+
+# Sizes in which charts can be requested with ?size=<name>, as (width, height in inches, dots per inch).
+# Other sizes are refused, so that requests cannot fill the chart cache with variants.
+KWIS_CHART_SIZES = {
+    'small': (4.8, 3.6, 100),
+    'large': (12.8, 9.6, 150),
 }
+
+# Draw charts in the browser from their data, instead of showing images rendered by the server
+KWIS_CLIENT_CHARTS = bool(int(os.environ.get("KWIS_CLIENT_CHARTS", default=0)))
+
+# Render all charts to files in MEDIA_ROOT after the quiz data changed, so that the web server serves them.
+# Changes within the debounce time (seconds) are rendered once, delayed at most the max delay.
+KWIS_PRERENDER_CHARTS = bool(int(os.environ.get("KWIS_PRERENDER_CHARTS", default=0)))
+KWIS_PRERENDER_DEBOUNCE = float(os.environ.get("KWIS_PRERENDER_DEBOUNCE", default=1.0))
+KWIS_PRERENDER_MAX_DELAY = float(os.environ.get("KWIS_PRERENDER_MAX_DELAY", default=5.0))
+
+# Refresh connected clients automatically when scores, teams or rounds change.
+# Changes within the debounce time (seconds) are sent as one refresh, delayed at most the max delay.
+KWIS_AUTO_REFRESH = bool(int(os.environ.get("KWIS_AUTO_REFRESH", default=1)))
+KWIS_REFRESH_DEBOUNCE = float(os.environ.get("KWIS_REFRESH_DEBOUNCE", default=0.5))
+KWIS_REFRESH_MAX_DELAY = float(os.environ.get("KWIS_REFRESH_MAX_DELAY", default=2.0))
+
+# Token that Prometheus sends as "Authorization: Bearer <token>" to scrape /kwis/metrics; staff can always view it
+KWIS_METRICS_TOKEN = os.environ.get("KWIS_METRICS_TOKEN", default="")
+
+# Token that scoring devices send as "Authorization: Bearer <token>" to post scores to /kwis/api/scores.
+# Logged in users can always post scores from pages of the site, sending the CSRF token like forms do.
+KWIS_API_TOKEN = os.environ.get("KWIS_API_TOKEN", default="")